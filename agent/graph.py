@@ -1,6 +1,9 @@
+import threading
 from langgraph.graph import StateGraph, START, END
 from agent.utils.state import DocumentState
 from agent.utils.nodes import (
+    clean_document_node,
+    filter_relevance_node,
     decide_split,
     split_into_chunks,
     generate_xmindmark_direct,
@@ -15,6 +18,8 @@ from langgraph.types import Send
 def build_graph():
     builder = StateGraph(DocumentState)
 
+    builder.add_node("clean_document", clean_document_node)
+    builder.add_node("filter_relevance", filter_relevance_node)
     builder.add_node("check_split", decide_split)
     builder.add_node("generate_global_title", generate_global_title_node)
     builder.add_node("split_chunks", split_into_chunks)
@@ -22,7 +27,9 @@ def build_graph():
     builder.add_node("generate_chunk_xmind", generate_xmindmark_for_chunk)
     builder.add_node("merge_xmind", merge_all_xmindmarks)
 
-    builder.add_edge(START, "check_split")
+    builder.add_edge(START, "clean_document")
+    builder.add_edge("clean_document", "filter_relevance")
+    builder.add_edge("filter_relevance", "check_split")
 
     def route_after_split(state: DocumentState):
         if state["need_split"]:
@@ -40,20 +47,59 @@ def build_graph():
     )
     
     def continue_generate_chunk_xmind(state: DocumentState):
-        return [Send("generate_chunk_xmind", {"chunk_index": idx, "chunk_content": chunk_content, "user_requirements": state["user_requirements"]}) for idx, chunk_content in enumerate(state["chunks"])]
+        # Tiêu đề được sinh song song với các chunk, cả hai cùng join tại merge_xmind
+        targets = ["generate_global_title"]
+        # Chunk đã được sinh song song với LLM split thì chỉ còn chờ tiêu đề
+        if state["xmindmark_chunks_content"]:
+            return targets
+        return targets + [Send("generate_chunk_xmind", {"chunk_index": idx, "chunk_content": chunk_content, "user_requirements": state["user_requirements"]}) for idx, chunk_content in enumerate(state["chunks"])]
 
 
-    builder.add_edge("split_chunks", "generate_global_title")
-    builder.add_conditional_edges("generate_global_title", continue_generate_chunk_xmind, ["generate_chunk_xmind"])
+    builder.add_conditional_edges("split_chunks", continue_generate_chunk_xmind, ["generate_chunk_xmind", "generate_global_title"])
     
     
     builder.add_edge("generate_chunk_xmind", "merge_xmind")
+    builder.add_edge("generate_global_title", "merge_xmind")
     builder.add_edge("merge_xmind", END)
     builder.add_edge("generate_direct", END)
 
     return builder.compile()
 
 
+# Registry các graph đã compile: mỗi variant chỉ build + compile một lần cho cả process,
+# các request dùng chung graph và truyền tham số riêng qua config.
+GRAPH_BUILDERS = {
+    "default": build_graph,
+}
+
+_compiled_graphs = {}
+_compiled_graphs_lock = threading.Lock()
+
+
+def get_graph(variant: str = "default"):
+    """Trả về graph đã compile cho variant, compile ở lần gọi đầu tiên"""
+    graph = _compiled_graphs.get(variant)
+    if graph is not None:
+        return graph
+
+    with _compiled_graphs_lock:
+        graph = _compiled_graphs.get(variant)
+        if graph is None:
+            builder = GRAPH_BUILDERS.get(variant)
+            if builder is None:
+                raise ValueError(f"Graph variant '{variant}' không tồn tại")
+            graph = builder()
+            _compiled_graphs[variant] = graph
+    return graph
+
+
+def warmup_graphs() -> list[str]:
+    """Compile trước toàn bộ variant, dùng khi khởi động app"""
+    for variant in GRAPH_BUILDERS:
+        get_graph(variant)
+    return list(GRAPH_BUILDERS)
+
+
 # graph = build_graph()
 
 # # Lưu hình ảnh ra file PNG
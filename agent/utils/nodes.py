@@ -1,43 +1,131 @@
 from agent.utils.state import DocumentState
-from agent.utils.tools import check_need_split, split_text, merge_xmindmarks
-from core.llm_handle import generate_xmindmark, generate_global_title
+from agent.utils.tools import check_need_split, split_text, split_text_pipelined, merge_xmindmarks, SPLIT_MODE
+from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.runnables import RunnableConfig
+from core.llm_handle import agenerate_xmindmark, agenerate_global_title, used_llm
+from core.cache import chunk_cache, make_cache_key
+from core.chunker import build_outline
+from core.ingest import resolve_text, write_blobs
+from core.cleanup import CLEANUP_ENABLED, clean_document
+from core.relevance_filter import RELEVANCE_KEEP_RATIO, filter_relevant
+from core.prompt import PROMPT_VERSION
+from typing import Tuple, Union
+import asyncio
 from typing_extensions import TypedDict
 
 
-def decide_split(state: DocumentState) -> DocumentState:
-    state["need_split"] = check_need_split(state["input_text"])
-    return state
+def document_text(state: DocumentState) -> str:
+    """Nội dung tài liệu; với tài liệu lưu dạng blob thì chỉ đọc từ đĩa khi node cần"""
+    return resolve_text(state["input_ref"]) if state.get("input_ref") else state["input_text"]
 
 
-def split_into_chunks(state: DocumentState) -> DocumentState:
-    state["chunks"] = split_text(state["input_text"], state["user_requirements"])
-    # THÊM: Khởi tạo list rỗng
-    state["xmindmark_chunks_content"] = []
-    return state
+async def adocument_text(state: DocumentState) -> str:
+    """document_text cho node async: đọc mmap + decode chạy trong thread, không chặn event loop"""
+    if not state.get("input_ref"):
+        return state["input_text"]
+    return await asyncio.to_thread(resolve_text, state["input_ref"])
+
+
+def clean_document_node(state: DocumentState):
+    """Làm sạch văn bản trích xuất (header/footer, số trang, đoạn trùng...) trước khi đếm token và chia chunk"""
+    if not CLEANUP_ENABLED:
+        return {}
+    cleaned, stats = clean_document(document_text(state))
+    if state.get("input_ref"):
+        return {"input_ref": write_blobs([cleaned], prefix="clean")[0], "cleanup_stats": stats}
+    return {"input_text": cleaned, "cleanup_stats": stats}
+
+
+def filter_relevance_node(state: DocumentState, config: RunnableConfig):
+    """Bỏ các đoạn không liên quan tới yêu cầu (BM25) trước khi chia chunk"""
+    keep_ratio = config.get("configurable", {}).get("keep_ratio")
+    keep_ratio = RELEVANCE_KEEP_RATIO if keep_ratio is None else keep_ratio
+    filtered, stats = filter_relevant(document_text(state), state["user_requirements"], keep_ratio)
+    if not stats["relevance_filtered"]:
+        return {"relevance_stats": stats}
+    if state.get("input_ref"):
+        return {"input_ref": write_blobs([filtered], prefix="relevant")[0], "relevance_stats": stats}
+    return {"input_text": filtered, "relevance_stats": stats}
+
+
+def decide_split(state: DocumentState):
+    return {"need_split": check_need_split(document_text(state), state["user_requirements"])}
+
+
+# Custom event báo một chunk đã sinh xong XMindMark (dùng cho progress khi stream)
+CHUNK_DONE_EVENT = "xmindmark_chunk_done"
+
+
+async def _generate_chunk_xmindmark(chunk_index: int, chunk_content: str, user_requirements: str) -> Tuple[str, bool]:
+    """Sinh XMindMark cho một chunk, dùng lại kết quả đã lưu theo hash nội dung chunk + yêu cầu"""
+    cache_key = make_cache_key(
+        mode="chunk",
+        chunk_content=chunk_content,
+        user_requirements=user_requirements,
+        model=used_llm.model_name,
+        prompt_version=PROMPT_VERSION,
+    )
+    xmind_chunk = chunk_cache.get(cache_key)
+    cached = xmind_chunk is not None
+    if not cached:
+        print(f"Processing chunk [{chunk_index}]")
+        xmind_chunk = await agenerate_xmindmark(chunk_content, user_requirements)
+        if xmind_chunk.strip():
+            chunk_cache.set(cache_key, xmind_chunk)
+
+    await adispatch_custom_event(CHUNK_DONE_EVENT, {"chunk_index": chunk_index, "xmindmark": xmind_chunk, "cached": cached})
+    return xmind_chunk, cached
+
+
+async def split_into_chunks(state: DocumentState, config: RunnableConfig):
+    split_mode = config.get("configurable", {}).get("split_mode") or SPLIT_MODE
+    user_requirements = state["user_requirements"]
+
+    if split_mode == "llm":
+        # Các chunk được sinh XMindMark ngay trong lúc LLM đang chia đoạn
+        chunks, results = await split_text_pipelined(
+            await adocument_text(state),
+            user_requirements,
+            lambda idx, chunk: _generate_chunk_xmindmark(idx, chunk, user_requirements),
+        )
+    else:
+        chunks, results = await split_text(await adocument_text(state), user_requirements, split_mode), []
+
+    if state.get("input_ref"):
+        # Các nhánh fan-out chỉ nhận tham chiếu tới chunk, không mang theo bản sao nội dung
+        chunks = await asyncio.to_thread(write_blobs, chunks)
+
+    return {
+        "chunks": chunks,
+        "xmindmark_chunks_content": [xmind_chunk for xmind_chunk, _ in results],
+        "chunk_cache_hits": [cached for _, cached in results],
+    }
 
 
 class ChunkState(TypedDict):
     chunk_index: int
-    chunk_content: str
+    # Chuỗi hoặc BlobRef
+    chunk_content: Union[str, dict]
     user_requirements: str
 
-def generate_xmindmark_for_chunk(state: ChunkState):
-    # Process current chunk
-    print(f"Processing chunk [{state['chunk_index']}]")
-    xmind_chunk = generate_xmindmark(state["chunk_content"], state["user_requirements"])
-    return {"xmindmark_chunks_content": [xmind_chunk]}
+async def generate_xmindmark_for_chunk(state: ChunkState):
+    chunk_content = await asyncio.to_thread(resolve_text, state["chunk_content"])
+    xmind_chunk, cached = await _generate_chunk_xmindmark(state["chunk_index"], chunk_content, state["user_requirements"])
+    return {"xmindmark_chunks_content": [xmind_chunk], "chunk_cache_hits": [cached]}
 
 
-def generate_xmindmark_direct(state: DocumentState):
-    response = generate_xmindmark(state["input_text"], state["user_requirements"])
+async def generate_xmindmark_direct(state: DocumentState):
+    response = await agenerate_xmindmark(await adocument_text(state), state["user_requirements"])
     return {"xmindmark_final": response}
 
 
-def merge_all_xmindmarks(state: DocumentState):
-    response = merge_xmindmarks(state["xmindmark_chunks_content"], state["global_title"], state["user_requirements"])
+async def merge_all_xmindmarks(state: DocumentState):
+    response = await merge_xmindmarks(state["xmindmark_chunks_content"], state["global_title"], state["user_requirements"])
     return {"xmindmark_final": response}
 
 
-def generate_global_title_node(state: DocumentState):
-    response = generate_global_title(state["input_text"], state["user_requirements"])
+async def generate_global_title_node(state: DocumentState):
+    # Chỉ cần dàn ý để đặt tiêu đề 3-8 từ, không gửi toàn bộ tài liệu
+    outline = await asyncio.to_thread(lambda: build_outline(document_text(state)))
+    response = await agenerate_global_title(outline, state["user_requirements"])
     return {"global_title": response}
\ No newline at end of file
@@ -1,14 +1,23 @@
 from typing_extensions import TypedDict, Annotated
-from typing import List
+from typing import List, Optional, Union
 from operator import add
 
 
 class DocumentState(TypedDict):
     input_text: str
+    # Tài liệu lớn được giữ trên đĩa: tham chiếu blob (core.ingest.BlobRef) thay cho input_text
+    input_ref: Optional[dict]
     user_requirements: str
     need_split: bool
-    chunks: List[str]
+    # Chuỗi, hoặc BlobRef khi tài liệu đến từ blob
+    chunks: List[Union[str, dict]]
     # xmindmark_chunks_content: Annotated[List[str], add]
     xmindmark_chunks_content: Annotated[List[str], add]
+    # True/False cho từng chunk: XMindMark lấy từ cache hay sinh mới
+    chunk_cache_hits: Annotated[List[bool], add]
     xmindmark_final: str
-    global_title: str
\ No newline at end of file
+    global_title: str
+    # Thống kê bước làm sạch tài liệu (số token trước/sau, số dòng bị loại...)
+    cleanup_stats: dict
+    # Thống kê bộ lọc đoạn theo mức liên quan tới yêu cầu
+    relevance_stats: dict
\ No newline at end of file
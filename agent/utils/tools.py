@@ -1,22 +1,104 @@
-from core.llm_handle import split_text_with_llm, merge_xmindmark_with_llm
+from core.llm_handle import asplit_text_with_llm, asplit_text_with_llm_stream, amerge_xmindmark_with_llm
+from core.chunker import chunk_document
+from core.llm_provider import CONTEXT_WINDOW, MAX_TOKENS
+from core.prompt import create_xmindmark_prompt
+from core.tokens import count_tokens
+from core.xmindmark import parse_xmindmark, prune, to_xmindmark
+from core.xmindmark_merge import merge_xmindmark_trees
+from core.json_stream import JsonStringArrayParser, parse_json_string_array
+import asyncio
 import logging
-from typing import List
+import os
+from typing import Any, Awaitable, Callable, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# "local": chia theo cấu trúc tài liệu, không tốn LLM call; "llm": để LLM tự chia đoạn
+SPLIT_MODE = os.getenv("SPLIT_MODE", "local")
 
-def check_need_split(text: str, max_length: int = 100) -> bool:
-    return len(text) > max_length
+# Số token prompt tối đa để xử lý tài liệu bằng một lần gọi LLM (generate_direct).
+# Mặc định: toàn bộ context window trừ phần dành cho output.
+DIRECT_MAX_PROMPT_TOKENS = int(os.getenv("DIRECT_MAX_PROMPT_TOKENS") or CONTEXT_WINDOW - MAX_TOKENS)
 
+# "tree": merge theo từng nhóm MERGE_FAN_IN map song song, lặp theo tầng tới khi còn một map;
+# "flat": gửi toàn bộ map trong một lần gọi LLM
+MERGE_MODE = os.getenv("MERGE_MODE", "tree")
+MERGE_FAN_IN = max(2, int(os.getenv("MERGE_FAN_IN", 4)))
+# Mỗi map được cắt về độ sâu / số node này trước khi đưa vào prompt merge
+MERGE_PRUNE_DEPTH = int(os.getenv("MERGE_PRUNE_DEPTH", 5))
+MERGE_PRUNE_NODES = int(os.getenv("MERGE_PRUNE_NODES", 150))
+# Các chunk gần như không trùng nhau (overlap thấp hơn ngưỡng) thì dùng luôn kết quả
+# merge local, bỏ qua lần gọi LLM merge
+MERGE_SKIP_LLM_OVERLAP = float(os.getenv("MERGE_SKIP_LLM_OVERLAP", 0.1))
 
-def split_text(text: str, user_requirements: str) -> List[str]:
-    chunks = eval(split_text_with_llm(text, user_requirements))
-    logger.info(f"Chunks: {chunks}")
+
+def check_need_split(text: str, user_requirements: str = "", max_prompt_tokens: int = DIRECT_MAX_PROMPT_TOKENS) -> bool:
+    """Chỉ chia khi prompt sinh trực tiếp không vừa một lần gọi LLM"""
+    prompt_tokens = count_tokens(create_xmindmark_prompt(text, user_requirements))
+    logger.info(f"Direct prompt tokens: {prompt_tokens}/{max_prompt_tokens}")
+    return prompt_tokens > max_prompt_tokens
+
+
+async def split_text(text: str, user_requirements: str, mode: str = SPLIT_MODE) -> List[str]:
+    if mode == "llm":
+        try:
+            chunks = parse_json_string_array(await asplit_text_with_llm(text, user_requirements))
+        except ValueError as e:
+            logger.warning(f"LLM split trả về sai định dạng ({e}), fallback to local split")
+            chunks = []
+        chunks = [c for c in chunks if c.strip()] or await asyncio.to_thread(chunk_document, text)
+    else:
+        chunks = await asyncio.to_thread(chunk_document, text)
+    logger.info(f"Chunks: {len(chunks)}")
     
     return chunks
 
 
-def merge_xmindmarks(chunks: list[str], global_title: str, user_requirements: str) -> str:
+async def split_text_pipelined(
+    text: str,
+    user_requirements: str,
+    generate_chunk: Callable[[int, str], Awaitable[Any]],
+) -> Tuple[List[str], List[Any]]:
+    """
+    Stream kết quả LLM split và gọi generate_chunk cho từng đoạn ngay khi chuỗi JSON
+    của đoạn đó đóng, để việc sinh XMindMark chạy song song với chính LLM split.
+    Trả về (chunks, kết quả generate_chunk của từng chunk). Nếu output sai định dạng thì huỷ
+    các task đã gửi và trả về (chunks chia local, []) để graph tự fan-out.
+    """
+    parser = JsonStringArrayParser()
+    tasks: List[asyncio.Task] = []
+    try:
+        async for delta in asplit_text_with_llm_stream(text, user_requirements):
+            for chunk in parser.feed(delta):
+                if chunk.strip():
+                    tasks.append(asyncio.create_task(generate_chunk(len(tasks), chunk)))
+        chunks = [c for c in parser.close() if c.strip()]
+        if not chunks:
+            raise ValueError("LLM split không trả về đoạn nào")
+    except ValueError as e:
+        await _cancel_tasks(tasks)
+        logger.warning(f"LLM split trả về sai định dạng ({e}), fallback to local split")
+        return chunk_document(text), []
+    except BaseException:
+        # Lỗi mạng / API hoặc node bị huỷ: không để các task sinh chunk tiếp tục gọi LLM
+        await _cancel_tasks(tasks)
+        raise
+
+    logger.info(f"Chunks: {len(chunks)}")
+    try:
+        return chunks, list(await asyncio.gather(*tasks))
+    except BaseException:
+        await _cancel_tasks(tasks)
+        raise
+
+
+async def _cancel_tasks(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def merge_xmindmarks(chunks: list[str], global_title: str, user_requirements: str, mode: str = MERGE_MODE) -> str:
     """
     Sử dụng LLM để merge và refine các XMindMark chunks thành một mind map hoàn chỉnh
     """
@@ -26,16 +108,54 @@ def merge_xmindmarks(chunks: list[str], global_title: str, user_requirements: st
         if chunks:
             return f"{global_title}\n- {chunks[0]}"
         return global_title
-    
+
+    local_merge = merge_xmindmark_trees(chunks, global_title)
+    logger.info(f"Local merge overlap: {local_merge.overlap:.2f} ({local_merge.matched_nodes}/{local_merge.incoming_nodes})")
+    if local_merge.overlap < MERGE_SKIP_LLM_OVERLAP:
+        return to_xmindmark(local_merge.tree)
+
+    if mode == "tree":
+        return await merge_xmindmarks_tree(chunks, global_title, user_requirements)
+    return await _merge_with_llm(chunks, global_title, user_requirements)
+
+
+async def merge_xmindmarks_tree(chunks: list[str], global_title: str, user_requirements: str, fan_in: int = MERGE_FAN_IN) -> str:
+    """
+    Tree-reduce: merge song song từng nhóm tối đa fan_in map, lặp theo tầng tới khi còn
+    một map. Mỗi prompt chỉ chứa fan_in map đã cắt gọn nên độ trễ tăng theo log(số chunk).
+    """
+    level = list(chunks)
+    while len(level) > fan_in:
+        groups = [level[i:i + fan_in] for i in range(0, len(level), fan_in)]
+        logger.info(f"Tree merge: {len(level)} maps -> {len(groups)}")
+        level = list(await asyncio.gather(*(
+            _merge_with_llm(group, global_title, user_requirements, intermediate=True) if len(group) > 1 else _identity(group[0])
+            for group in groups
+        )))
+    return await _merge_with_llm(level, global_title, user_requirements)
+
+
+async def _identity(xmindmark: str) -> str:
+    return xmindmark
+
+
+def _prune_for_merge(xmindmark: str) -> str:
+    tree = parse_xmindmark(xmindmark)
+    if tree.count() <= MERGE_PRUNE_NODES and tree.depth() <= MERGE_PRUNE_DEPTH:
+        return xmindmark
+    return to_xmindmark(prune(tree, MERGE_PRUNE_DEPTH, MERGE_PRUNE_NODES))
+
+
+async def _merge_with_llm(chunks: list[str], global_title: str, user_requirements: str, intermediate: bool = False) -> str:
     # Chuẩn bị context cho LLM
     chunks_text = ""
     for i, chunk in enumerate(chunks, 1):
-        chunks_text += f"\n--- CHUNK {i} ---\n{chunk}\n"
+        chunks_text += f"\n--- CHUNK {i} ---\n{_prune_for_merge(chunk)}\n"
     
     
     try:
         # Gọi LLM để merge và refine
-        response = merge_xmindmark_with_llm(chunks_text, global_title, user_requirements)
+        response = await amerge_xmindmark_with_llm(chunks_text, global_title, user_requirements, intermediate)
         refined_mindmap = response.strip()
         
         # Validation cơ bản
@@ -46,26 +166,5 @@ def merge_xmindmarks(chunks: list[str], global_title: str, user_requirements: st
         return refined_mindmap
         
     except Exception as e:
-        print(f"Warning: LLM merge failed ({e}), fallback to simple merge")
-        # Fallback về method cũ
-        return merge_xmindmarks_simple(chunks, global_title)
-
-
-def merge_xmindmarks_simple(chunks: list[str], global_title: str) -> str:
-    merged_lines = [global_title]  # Root node
-    
-    for chunk in chunks:
-        lines = chunk.strip().splitlines()
-        if not lines:
-            continue
-            
-        first_line = lines[0].strip()
-        if first_line:
-            merged_lines.append(f"- {first_line}")
-        
-        for line in lines[1:]:
-            if line.strip():
-                indented_line = "  " + line
-                merged_lines.append(indented_line)
-    
-    return "\n".join(merged_lines)
+        print(f"Warning: LLM merge failed ({e}), fallback to local merge")
+        return to_xmindmark(merge_xmindmark_trees(chunks, global_title).tree)
@@ -1,18 +1,31 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
-from core.llm_handle import edit_xmindmark_with_llm, generate_xmindmark_no_docs_stream, generate_xmindmark_with_search_stream, edit_xmindmark_with_llm_search, generate_xmindmark_with_search, generate_xmindmark_no_docs
-from core.utils import xmindmark_to_svg, xmindmark_to_xmind_file
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Query
+from fastapi.responses import Response, StreamingResponse
+from core.llm_handle import aedit_xmindmark_with_llm, aedit_xmindmark_with_patch, aedit_xmindmark_scoped, agenerate_xmindmark_no_docs_stream, agenerate_xmindmark_with_search_stream, aedit_xmindmark_with_llm_search, agenerate_xmindmark_with_search, agenerate_xmindmark_no_docs, used_llm
+from core.cache import make_cache_key, result_cache
+from core.prompt import PROMPT_VERSION
+from core.render_cache import etag_for, etag_matches, render_cache, render_key
+from core.render_pool import RENDER_BATCH_MAX_ITEMS, render_batch, stream_zip
 from core.graph import generate_xmindmark_langgraph, generate_xmindmark_langgraph_stream
-from core.text_processing import extract_text_from_file
+from core.ingest import IngestLimitError, extract_upload_to_blob, spool_upload
+from core.jobs import JOB_BATCH_MAX_BYTES, TERMINAL_STATUSES, interactive_request, job_queue
 from pydantic import BaseModel, Field
-from typing import AsyncIterator
+from typing import AsyncIterator, Literal
+import asyncio
+import base64
 import json
-from io import BytesIO
+import os
 
 router = APIRouter()
 
+# Gửi heartbeat khi stream im lặng quá số giây này, tránh proxy cắt kết nối
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 10))
+
 # Response models for JSON streaming
 class StreamChunk(BaseModel):
+    type: Literal["delta", "stage", "chunk", "patch_op", "scope_delta", "heartbeat", "done"] = Field(
+        "delta",
+        description="Loại event: delta (nội dung), stage (bắt đầu/kết thúc bước), chunk (map của từng phần), patch_op (thao tác sửa map), scope_delta (nhánh đang được sửa), heartbeat, done"
+    )
     delta: str = Field(..., description="Delta text content")
     done: bool = Field(False, description="Có phải chunk cuối cùng không")
     metadata: dict = Field(default_factory=dict, description="Metadata bổ sung")
@@ -30,57 +43,123 @@ class GenerateXMindMarkFromDocsRequest(BaseModel):
 class GenerateXMindMarkNoDocsRequest(BaseModel):
     user_requirements: str = Field(..., description="Yêu cầu của người dùng để tạo mindmap")
     enable_search: bool = Field(False, description="Có bật tính năng tìm kiếm thông tin bổ sung hay không")
+    search_backend: Literal["tavily", "local", "both"] = Field("tavily", description="Nguồn tìm kiếm khi enable_search=True: tavily (internet), local (tài liệu nội bộ) hoặc both")
     stream: bool = Field(True, description="Có sử dụng streaming response hay không")
+    use_cache: bool = Field(True, description="Dùng lại kết quả đã tạo cho cùng yêu cầu nếu có")
 
 
 class XMindMark(BaseModel):
     content: str = Field(..., description="Nội dung XMindMark")
     
+class RenderItem(BaseModel):
+    content: str = Field(..., description="Nội dung XMindMark")
+    format: Literal["svg", "xmind"] = Field("svg", description="Định dạng output")
+    name: str | None = Field(None, description="Tên file trong kết quả (mặc định theo thứ tự item)")
+
+
+class RenderBatchRequest(BaseModel):
+    items: list[RenderItem] = Field(..., description="Danh sách map cần render")
+    output: Literal["zip", "ndjson"] = Field("zip", description="zip: một file zip; ndjson: mỗi dòng là kết quả một item (dữ liệu base64)")
+
+
+class RequirementJobItem(BaseModel):
+    user_requirements: str = Field(..., description="Yêu cầu của người dùng về mindmap")
+    enable_search: bool = Field(False, description="Có bật tính năng tìm kiếm hay không")
+    search_backend: Literal["tavily", "local", "both"] = Field("tavily", description="Nguồn tìm kiếm khi enable_search=True")
+
+
+class RequirementJobsRequest(BaseModel):
+    items: list[RequirementJobItem] = Field(..., description="Danh sách yêu cầu, mỗi yêu cầu là một job")
+    priority: int = Field(0, description="Job priority cao hơn được chạy trước")
+
+
 class EditXMindMarkRequest(BaseModel):
     current_xmindmark: str = Field(..., description="Nội dung XMindMark hiện tại cần chỉnh sửa")
     edit_request: str = Field(..., description="Yêu cầu chỉnh sửa từ người dùng")
+    edit_mode: Literal["full", "patch"] = Field("full", description="full: LLM viết lại toàn bộ map; patch: LLM trả về các thao tác sửa cây, server tự áp dụng")
+    target_path: str | None = Field(None, description="Đường dẫn nhánh cần sửa, các nhãn nối bằng ' > ' (vd: 'Kỹ năng > Nghe'); chỉ nhánh này được gửi cho LLM")
+    auto_scope: bool = Field(False, description="Khi không có target_path, server tự tìm nhánh được nhắc tới trong edit_request để chỉ sửa nhánh đó")
     enable_search: bool = Field(False, description="Có bật tính năng tìm kiếm khi chỉnh sửa hay không")
+    search_backend: Literal["tavily", "local", "both"] = Field("tavily", description="Nguồn tìm kiếm khi enable_search=True: tavily (internet), local (tài liệu nội bộ) hoặc both")
     original_user_requirements: str = Field("", description="Yêu cầu ban đầu của người dùng (cần thiết khi enable_search=True)")
+    use_cache: bool = Field(True, description="Dùng lại kết quả đã tạo cho cùng yêu cầu nếu có")
     
 
 # Utility functions for JSON streaming
+_HEARTBEAT = {"type": "heartbeat"}
+
+
+async def _iterate_with_heartbeat(generator, interval: float):
+    """Lặp async generator, chèn heartbeat mỗi khi chờ item tiếp theo quá interval giây"""
+    iterator = generator.__aiter__()
+    next_item = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_item}, timeout=interval)
+            if not done:
+                yield _HEARTBEAT
+                continue
+            try:
+                item = next_item.result()
+            except StopAsyncIteration:
+                return
+            yield item
+            next_item = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if not next_item.done():
+            next_item.cancel()
+
+
+async def _iterate_sync(generator):
+    for item in generator:
+        yield item
+
+
 async def convert_to_json_stream(generator) -> AsyncIterator[str]:
     """
     Convert generator thành JSON streaming format
-    Hỗ trợ cả sync và async generators
+    Hỗ trợ cả sync và async generators. Generator có thể yield chuỗi (delta)
+    hoặc dict event {"type": ..., "metadata": {...}}; event "metadata" được gộp
+    vào metadata của chunk cuối.
     """
     chunk_index = 0
-    
-    try:
-        # Try async iteration first
-        async for chunk in generator:
-            if chunk:  # Only yield non-empty chunks
-                response = StreamChunk(
-                    delta=chunk,
-                    done=False,
-                    metadata={"chunk_index": chunk_index}
-                )
-                yield json.dumps(response.model_dump(), ensure_ascii=False) + "\n"
-                chunk_index += 1
-    except TypeError:
-        # Fall back to sync iteration
-        for chunk in generator:
-            if chunk:  # Only yield non-empty chunks
-                response = StreamChunk(
-                    delta=chunk,
-                    done=False,
-                    metadata={"chunk_index": chunk_index}
-                )
-                yield json.dumps(response.model_dump(), ensure_ascii=False) + "\n"
-                chunk_index += 1
+    final_metadata = {}
+
+    if hasattr(generator, "__aiter__"):
+        items = _iterate_with_heartbeat(generator, STREAM_HEARTBEAT_SECONDS)
+    else:
+        items = _iterate_sync(generator)
+
+    async for chunk in items:
+        if isinstance(chunk, dict) and chunk["type"] == "metadata":
+            # Không gửi riêng, gộp vào metadata của chunk cuối
+            final_metadata.update(chunk.get("metadata", {}))
+        elif isinstance(chunk, dict):
+            response = StreamChunk(
+                type=chunk["type"],
+                delta=chunk.get("delta", ""),
+                done=False,
+                metadata=chunk.get("metadata", {})
+            )
+            yield json.dumps(response.model_dump(), ensure_ascii=False) + "\n"
+        elif chunk:  # Only yield non-empty chunks
+            response = StreamChunk(
+                delta=chunk,
+                done=False,
+                metadata={"chunk_index": chunk_index}
+            )
+            yield json.dumps(response.model_dump(), ensure_ascii=False) + "\n"
+            chunk_index += 1
     
     # Final chunk to signal completion
     final_response = StreamChunk(
+        type="done",
         delta="",
         done=True,
         metadata={
             "message": "Generation completed",
-            "total_chunks": chunk_index
+            "total_chunks": chunk_index,
+            **final_metadata
         }
     )
     yield json.dumps(final_response.model_dump(), ensure_ascii=False) + "\n"
@@ -105,6 +184,50 @@ def create_json_streaming_response(generator) -> StreamingResponse:
     )
     
  
+# Result cache
+def _result_cache_key(mode: str, **parts) -> str:
+    return make_cache_key(mode=mode, model=used_llm.model_name, prompt_version=PROMPT_VERSION, **parts)
+
+
+async def _replay_cached(content: str):
+    """Phát lại kết quả đã cache dưới dạng stream (mỗi dòng một delta)"""
+    yield {"type": "metadata", "metadata": {"cached": True}}
+    for line in content.splitlines(keepends=True):
+        yield line
+
+
+async def _store_stream_result(generator, cache_key: str):
+    """Chuyển tiếp stream, lưu toàn bộ nội dung vào cache khi stream kết thúc bình thường"""
+    parts = []
+    async with interactive_request():
+        async for chunk in generator:
+            if isinstance(chunk, str):
+                parts.append(chunk)
+            yield chunk
+    content = "".join(parts)
+    if content.strip():
+        await asyncio.to_thread(result_cache.set, cache_key, content)
+
+
+async def _cached_streaming_response(generator_factory, cache_key: str, use_cache: bool = True) -> StreamingResponse:
+    # Đọc / ghi cache SQLite trong thread, không chặn event loop
+    cached = await asyncio.to_thread(result_cache.get, cache_key) if use_cache else None
+    if cached is not None:
+        return create_json_streaming_response(_replay_cached(cached))
+    return create_json_streaming_response(_store_stream_result(generator_factory(), cache_key))
+
+
+async def _cached_result(coroutine_factory, cache_key: str, use_cache: bool = True) -> str:
+    cached = await asyncio.to_thread(result_cache.get, cache_key) if use_cache else None
+    if cached is not None:
+        return cached
+    async with interactive_request():
+        content = await coroutine_factory()
+    if content.strip():
+        await asyncio.to_thread(result_cache.set, cache_key, content)
+    return content
+
+
 @router.post("/edit-xmindmark", tags=["edit xmindmark"])
 async def edit_xmindmark_api(request: EditXMindMarkRequest) -> StreamingResponse:
     """
@@ -116,8 +239,17 @@ async def edit_xmindmark_api(request: EditXMindMarkRequest) -> StreamingResponse
     **Tham số:**
     - `current_xmindmark`: Nội dung XMindMark hiện tại cần chỉnh sửa
     - `edit_request`: Yêu cầu chỉnh sửa cụ thể (thêm node, xóa node, thay đổi cấu trúc, v.v.)
+    - `edit_mode`: `full` (mặc định) sinh lại toàn bộ map; `patch` chỉ sinh các thao tác add/remove/rename/move/replace
+      và áp dụng trên server, stream từng thao tác (`type: patch_op`) rồi map đã sửa. Không áp dụng được thì tự quay về `full`.
+      Khi `enable_search=true` luôn dùng `full`.
+    - `target_path`: Chỉ sửa nhánh này (vd: `"Kỹ năng > Nghe"`); LLM chỉ nhận nhánh và dàn ý các node tổ tiên,
+      server ghép nhánh đã sửa vào map và stream map hoàn chỉnh
+    - `auto_scope`: Không có `target_path` thì tự tìm nhánh có nhãn được nhắc trong `edit_request`;
+      không tìm được thì sửa toàn bộ map. Nhánh đã dùng được báo trong event `metadata` (`edit_scope`)
     - `enable_search`: Bật/tắt tính năng tìm kiếm thông tin bổ sung khi chỉnh sửa
+    - `search_backend`: Nguồn tìm kiếm: `tavily` (internet), `local` (index tài liệu nội bộ) hoặc `both`
     - `original_user_requirements`: Yêu cầu ban đầu (bắt buộc khi enable_search=True)
+    - `use_cache`: Dùng lại kết quả đã cache cho cùng yêu cầu (mặc định: True)
     
     **Ví dụ sử dụng:**
     ```json
@@ -137,40 +269,80 @@ async def edit_xmindmark_api(request: EditXMindMarkRequest) -> StreamingResponse
     if request.enable_search:
         if not request.original_user_requirements:
             raise ValueError("original_user_requirements is required when enable_search is True")
-        response = edit_xmindmark_with_llm_search(
+        generator_factory = lambda: aedit_xmindmark_with_llm_search(
             user_requirements=request.original_user_requirements,
             edit_request=request.edit_request,
-            current_xmindmark=request.current_xmindmark
+            current_xmindmark=request.current_xmindmark,
+            search_backend=request.search_backend
+        )
+    elif request.target_path is not None or request.auto_scope:
+        generator_factory = lambda: aedit_xmindmark_scoped(
+            request.current_xmindmark,
+            request.edit_request,
+            target_path=request.target_path,
+            edit_mode=request.edit_mode
         )
+    elif request.edit_mode == "patch":
+        generator_factory = lambda: aedit_xmindmark_with_patch(request.current_xmindmark, request.edit_request)
     else:
-        response = edit_xmindmark_with_llm(request.current_xmindmark, request.edit_request)
-    return create_json_streaming_response(response)
+        generator_factory = lambda: aedit_xmindmark_with_llm(request.current_xmindmark, request.edit_request)
+
+    cache_key = _result_cache_key(
+        "edit",
+        current_xmindmark=request.current_xmindmark,
+        edit_request=request.edit_request,
+        edit_mode=request.edit_mode if not request.enable_search else "full",
+        target_path=request.target_path if not request.enable_search else None,
+        auto_scope=request.auto_scope and not request.enable_search,
+        enable_search=request.enable_search,
+        search_backend=request.search_backend if request.enable_search else "",
+        user_requirements=request.original_user_requirements if request.enable_search else "",
+    )
+    return await _cached_streaming_response(generator_factory, cache_key, request.use_cache)
 
 
 @router.post("/generate-xmindmark-from-docs", tags=["generate xmindmark"])
 async def generate_xmindmark_langgraph_api(
     uploaded_file: UploadFile = File(..., description="Tệp tài liệu (PDF, DOCX, hoặc MD)"),
     user_requirements: str = Form(..., description="Yêu cầu cụ thể của người dùng về mindmap"),
-    stream: bool = Form(..., description="Có sử dụng streaming response hay không")
+    stream: bool = Form(..., description="Có sử dụng streaming response hay không"),
+    split_mode: Literal["local", "llm"] | None = Form(None, description="Cách chia tài liệu: 'local' theo cấu trúc hoặc 'llm'; mặc định lấy SPLIT_MODE"),
+    keep_ratio: float | None = Form(None, ge=0, le=1, description="Tỉ lệ tối đa số đoạn giữ lại theo mức liên quan tới yêu cầu (1 = không lọc); mặc định lấy RELEVANCE_KEEP_RATIO"),
+    use_cache: bool = Form(True, description="Dùng lại kết quả đã tạo cho cùng tài liệu và yêu cầu nếu có")
 ):
     """
     Tạo mindmap XMindMark từ tài liệu sử dụng LangGraph
+
+    File vượt `MAX_UPLOAD_BYTES` hoặc PDF nhiều hơn `MAX_DOCUMENT_PAGES` trang bị từ chối với mã 413.
     """
     try:
-        document_content = extract_text_from_file(uploaded_file)
+        # File được spool ra đĩa, văn bản trích xuất nằm trong blob; graph chỉ nhận tham chiếu
+        upload = await spool_upload(uploaded_file)
+        document_content = await asyncio.to_thread(extract_upload_to_blob, upload)
+    except IngestLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=400, detail=f"Lỗi khi đọc file: {str(e)}")
+
+    cache_key = _result_cache_key(
+        "docs",
+        document_sha256=upload.sha256,
+        user_requirements=user_requirements,
+        split_mode=split_mode or "",
+        keep_ratio=keep_ratio,
+    )
 
     if stream:
-        response_generator = generate_xmindmark_langgraph_stream(
-            document_content,
-            user_requirements
+        return await _cached_streaming_response(
+            lambda: generate_xmindmark_langgraph_stream(document_content, user_requirements, split_mode, keep_ratio=keep_ratio),
+            cache_key,
+            use_cache
         )
-        return create_json_streaming_response(response_generator)
     else:
-        xmindmark = generate_xmindmark_langgraph(
-            document_content,
-            user_requirements
+        xmindmark = await _cached_result(
+            lambda: generate_xmindmark_langgraph(document_content, user_requirements, split_mode, keep_ratio=keep_ratio),
+            cache_key,
+            use_cache
         )
         return StreamingXMindMarkResponse(xmindmark=xmindmark)
 
@@ -187,7 +359,9 @@ async def generate_xmindmark_api(request: GenerateXMindMarkNoDocsRequest):
     **Tham số:**
     - `user_requirements`: Yêu cầu cụ thể về mindmap (chủ đề, cấu trúc, mức độ chi tiết)
     - `enable_search`: Bật/tắt tính năng tìm kiếm thông tin bổ sung từ internet
+    - `search_backend`: Nguồn tìm kiếm: `tavily` (internet), `local` (index tài liệu nội bộ) hoặc `both`
     - `stream`: Bật/tắt streaming response (mặc định: True)
+    - `use_cache`: Dùng lại kết quả đã cache cho cùng yêu cầu (mặc định: True)
     
     **Ví dụ sử dụng:**
     ```json
@@ -206,26 +380,44 @@ async def generate_xmindmark_api(request: GenerateXMindMarkNoDocsRequest):
     - Nếu `stream=true`: Streaming JSON response với các chunk delta
     - Nếu `stream=false`: JSON object với nội dung XMindMark hoàn chỉnh
     """
+    cache_key = _result_cache_key(
+        "no_docs",
+        user_requirements=request.user_requirements,
+        enable_search=request.enable_search,
+        search_backend=request.search_backend if request.enable_search else "",
+    )
+
     if request.stream:
         # Get appropriate generator based on search option
         if request.enable_search:
-            response_generator = generate_xmindmark_with_search_stream(request.user_requirements)
+            generator_factory = lambda: agenerate_xmindmark_with_search_stream(request.user_requirements, request.search_backend)
         else:
-            response_generator = generate_xmindmark_no_docs_stream(request.user_requirements)
+            generator_factory = lambda: agenerate_xmindmark_no_docs_stream(request.user_requirements)
         
-        return create_json_streaming_response(response_generator)
+        return await _cached_streaming_response(generator_factory, cache_key, request.use_cache)
     else:
         # Non-streaming response
         if request.enable_search:
-            xmindmark_content = generate_xmindmark_with_search(request.user_requirements)
+            coroutine_factory = lambda: agenerate_xmindmark_with_search(request.user_requirements, request.search_backend)
         else:
-            xmindmark_content = generate_xmindmark_no_docs(request.user_requirements)
+            coroutine_factory = lambda: agenerate_xmindmark_no_docs(request.user_requirements)
         
+        xmindmark_content = await _cached_result(coroutine_factory, cache_key, request.use_cache)
         return StreamingXMindMarkResponse(xmindmark=xmindmark_content)
 
 
+async def _render_response(content: str, fmt: str, media_type: str, content_disposition: str, if_none_match: str | None) -> Response:
+    """Trả 304 nếu client đã có đúng bản render (ETag = hash nội dung), ngược lại lấy từ render cache"""
+    etag = etag_for(render_key(content, fmt))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    data, etag = await asyncio.to_thread(render_cache.get_or_render, content, fmt)
+    return Response(data, media_type=media_type, headers={**headers, "Content-Disposition": content_disposition})
+
+
 @router.post("/to-svg", tags=["save to svg/xmind"])
-async def to_svg_bytes_api(xmindmark: XMindMark):
+async def to_svg_bytes_api(xmindmark: XMindMark, if_none_match: str | None = Header(None)):
     """
     Chuyển đổi XMindMark thành file SVG
     
@@ -249,20 +441,15 @@ async def to_svg_bytes_api(xmindmark: XMindMark):
     
     **Lưu ý:**
     - File SVG được tạo với kích thước tự động điều chỉnh theo nội dung
+    - SVG được render trực tiếp bằng Python (core/svg_render.py), không cần cài `xmindmark` CLI
+    - Kết quả được cache theo hash nội dung; gửi lại header `If-None-Match` với `ETag` đã nhận để nhận 304 khi map không đổi
     - Có thể mở file SVG trong trình duyệt web hoặc các ứng dụng hỗ trợ SVG
     """
-    svg_path = xmindmark_to_svg(xmindmark.content)
-    with open(svg_path, 'rb') as f:
-        svg_bytes = BytesIO(f.read())
-    return StreamingResponse(
-        svg_bytes,
-        media_type="image/svg+xml",
-        headers={"Content-Disposition": f"inline; filename=result.svg"}
-    )
+    return await _render_response(xmindmark.content, "svg", "image/svg+xml", "inline; filename=result.svg", if_none_match)
     
     
 @router.post("/to-xmind", tags=["save svg/xmind"])
-async def to_xmind_bytes_api(xmindmark: XMindMark):
+async def to_xmind_bytes_api(xmindmark: XMindMark, if_none_match: str | None = Header(None)):
     """
     Chuyển đổi XMindMark thành file .xmind
     
@@ -288,15 +475,196 @@ async def to_xmind_bytes_api(xmindmark: XMindMark):
     - File .xmind có thể mở trong ứng dụng XMind Desktop hoặc XMind Online
     - Cấu trúc mindmap sẽ được bảo toàn trong file .xmind
     - Có thể chỉnh sửa file .xmind trong ứng dụng XMind sau khi tải xuống
+    - File được tạo trực tiếp trong bộ nhớ (core/xmind_writer.py), không gọi CLI; kết quả được cache theo hash nội dung
+    - Hỗ trợ `ETag`/`If-None-Match` như `/to-svg`
     """
-    xmind_file_path = xmindmark_to_xmind_file(xmindmark.content)
-    if not xmind_file_path:
-        raise HTTPException(status_code=500, detail="Không tạo được file .xmind")
-    with open(xmind_file_path, 'rb') as f:
-        xmind_bytes = BytesIO(f.read())
-    
+    return await _render_response(xmindmark.content, "xmind", "application/octet-stream", "attachment; filename=result.xmind", if_none_match)
+
+
+def _batch_filename(index: int, item: RenderItem, used: set) -> str:
+    stem = os.path.basename(item.name or "") or f"{index:04d}"
+    if stem.endswith(f".{item.format}"):
+        stem = stem[: -len(item.format) - 1]
+    name = f"{stem}.{item.format}"
+    suffix = 1
+    while name in used:
+        suffix += 1
+        name = f"{stem}_{suffix}.{item.format}"
+    used.add(name)
+    return name
+
+
+@router.post("/render-batch", tags=["save to svg/xmind"])
+async def render_batch_api(request: RenderBatchRequest) -> StreamingResponse:
+    """
+    Render nhiều mindmap cùng lúc sang SVG/.xmind
+
+    **Mô tả:**
+    Các item được render song song trên process pool (số worker = số CPU, đổi bằng `PROCESS_POOL_WORKERS`)
+    và trả về ngay khi từng item xong, theo thứ tự hoàn thành. Item lỗi không làm hỏng cả batch.
+
+    **Tham số:**
+    - `items`: Danh sách `{content, format, name}`; `format` là `svg` hoặc `xmind`
+    - `output`: `zip` (mặc định) hoặc `ndjson`
+
+    **Response:**
+    - `zip`: file zip stream dần, lỗi từng item nằm trong `errors.json`
+    - `ndjson`: mỗi dòng `{index, name, format, ok, etag, data, error}`, `data` là base64
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items không được rỗng")
+    if len(request.items) > RENDER_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Tối đa {RENDER_BATCH_MAX_ITEMS} item mỗi batch")
+
+    used_names: set = set()
+    names = [_batch_filename(i, item, used_names) for i, item in enumerate(request.items)]
+    results = render_batch([(item.content, item.format) for item in request.items])
+
+    if request.output == "ndjson":
+        async def ndjson_lines():
+            async for index, data, error, etag in results:
+                item = request.items[index]
+                line = {
+                    "index": index,
+                    "name": names[index],
+                    "format": item.format,
+                    "ok": error is None,
+                    "etag": etag,
+                    "data": base64.b64encode(data).decode("ascii") if data is not None else None,
+                    "error": error,
+                }
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    async def named_results():
+        async for index, data, error, _ in results:
+            yield names[index], data, error
+
     return StreamingResponse(
-        xmind_bytes,
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename=result.xmind"}
-    )
\ No newline at end of file
+        stream_zip(named_results()),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=renders.zip"}
+    )
+
+
+# Job API: sinh mindmap hàng loạt chạy nền
+JOB_STATUS_POLL_SECONDS = float(os.getenv("JOB_STATUS_POLL_SECONDS", 1))
+
+
+@router.post("/jobs/docs", tags=["jobs"])
+async def submit_docs_jobs_api(
+    uploaded_files: list[UploadFile] = File(..., description="Các tệp tài liệu (PDF, DOCX, hoặc MD), mỗi tệp là một job"),
+    user_requirements: str = Form(..., description="Yêu cầu của người dùng, dùng chung cho mọi tệp"),
+    split_mode: Literal["local", "llm"] | None = Form(None, description="Cách chia tài liệu; mặc định lấy SPLIT_MODE"),
+    keep_ratio: float | None = Form(None, ge=0, le=1, description="Tỉ lệ tối đa số đoạn giữ lại theo mức liên quan tới yêu cầu"),
+    priority: int = Form(0, description="Job priority cao hơn được chạy trước")
+):
+    """
+    Gửi nhiều tài liệu để sinh mindmap chạy nền
+
+    **Mô tả:**
+    Mỗi tệp được lưu ra đĩa và tạo một job; API trả về ngay danh sách `job_ids`. Job được worker nền
+    xử lý với số lượng đồng thời giới hạn (`JOB_WORKERS`), và tạm dừng nhận job mới khi có request
+    tương tác đang chạy. Theo dõi bằng `GET /jobs`, `GET /jobs/stream` và lấy kết quả bằng `GET /jobs/{job_id}/result`.
+    """
+    # Spool và kiểm tra toàn bộ file trước, để request bị từ chối không để lại job nào
+    uploads = []
+    total_bytes = 0
+    for uploaded_file in uploaded_files:
+        try:
+            upload = await spool_upload(uploaded_file)
+            total_bytes += upload.size
+            if total_bytes > JOB_BATCH_MAX_BYTES:
+                raise IngestLimitError(f"Tổng dung lượng các file vượt quá giới hạn {JOB_BATCH_MAX_BYTES} bytes")
+        except IngestLimitError as e:
+            raise HTTPException(status_code=413, detail=f"{uploaded_file.filename}: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"{uploaded_file.filename}: {str(e)}")
+        uploads.append((upload, uploaded_file.filename or ""))
+
+    payload = {
+        "user_requirements": user_requirements,
+        "split_mode": split_mode,
+        "keep_ratio": keep_ratio,
+    }
+    job_ids = [
+        await asyncio.to_thread(job_queue.submit_upload, upload, payload, priority, filename)
+        for upload, filename in uploads
+    ]
+    return {"job_ids": job_ids}
+
+
+@router.post("/jobs/requirements", tags=["jobs"])
+async def submit_requirement_jobs_api(request: RequirementJobsRequest):
+    """
+    Gửi nhiều yêu cầu (không cần tài liệu) để sinh mindmap chạy nền, trả về danh sách `job_ids`
+    """
+    job_ids = [
+        await asyncio.to_thread(job_queue.submit, "requirements", item.model_dump(), request.priority, item.user_requirements[:100])
+        for item in request.items
+    ]
+    return {"job_ids": job_ids}
+
+
+def _parse_job_ids(ids: str) -> list[str]:
+    job_ids = [job_id.strip() for job_id in ids.split(",") if job_id.strip()]
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="ids không được rỗng")
+    return job_ids
+
+
+@router.get("/jobs", tags=["jobs"])
+async def get_jobs_api(ids: str = Query(..., description="Danh sách job_id, cách nhau bởi dấu phẩy")):
+    """Trạng thái của nhiều job: `queued`, `running`, `done`, `failed` hoặc `cancelled`"""
+    return {"jobs": await asyncio.to_thread(job_queue.get_many, _parse_job_ids(ids))}
+
+
+@router.get("/jobs/stream", tags=["jobs"])
+async def stream_jobs_api(ids: str = Query(..., description="Danh sách job_id, cách nhau bởi dấu phẩy")) -> StreamingResponse:
+    """
+    Stream NDJSON trạng thái job: mỗi dòng là một job vừa đổi trạng thái,
+    stream kết thúc khi mọi job đã xong (done / failed / cancelled)
+    """
+    job_ids = _parse_job_ids(ids)
+
+    async def status_lines():
+        last_status = {}
+        while True:
+            jobs = await asyncio.to_thread(job_queue.get_many, job_ids)
+            for job in jobs:
+                if last_status.get(job["id"]) != job["status"]:
+                    last_status[job["id"]] = job["status"]
+                    yield json.dumps(job, ensure_ascii=False) + "\n"
+            if all(job["status"] in TERMINAL_STATUSES for job in jobs):
+                return
+            await asyncio.sleep(JOB_STATUS_POLL_SECONDS)
+
+    return StreamingResponse(status_lines(), media_type="application/x-ndjson")
+
+
+@router.get("/jobs/{job_id}", tags=["jobs"])
+async def get_job_api(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job")
+    return job
+
+
+@router.get("/jobs/{job_id}/result", tags=["jobs"])
+async def get_job_result_api(job_id: str):
+    """Kết quả XMindMark của job đã xong; job chưa xong trả về 409"""
+    job = await asyncio.to_thread(job_queue.get, job_id, True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job đang ở trạng thái '{job['status']}'" + (f": {job['error']}" if job["error"] else ""))
+    return StreamingXMindMarkResponse(xmindmark=job["result"])
+
+
+@router.delete("/jobs/{job_id}", tags=["jobs"])
+async def cancel_job_api(job_id: str):
+    """Huỷ job còn trong hàng đợi"""
+    if not await asyncio.to_thread(job_queue.cancel, job_id):
+        raise HTTPException(status_code=409, detail="Chỉ huỷ được job đang chờ trong hàng đợi")
+    return {"cancelled": job_id}
@@ -0,0 +1,35 @@
+"""
+Đo chi phí build + compile graph mỗi request (cách cũ) so với lấy graph từ registry.
+
+Chạy: python -m benchmarks.bench_graph_startup [số lần lặp]
+"""
+import sys
+import time
+
+from agent.graph import build_graph, get_graph
+from core.warmup import warmup
+
+
+def _measure(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(repeat: int = 50):
+    start = time.perf_counter()
+    timings = warmup()
+    total_warmup = time.perf_counter() - start
+
+    per_request_build = _measure(build_graph, repeat)
+    per_request_registry = _measure(get_graph, repeat)
+
+    print(f"Warmup khi khởi động: {total_warmup * 1000:.1f} ms {timings}")
+    print(f"build_graph() mỗi request: {per_request_build * 1000:.3f} ms")
+    print(f"get_graph() mỗi request:   {per_request_registry * 1000:.3f} ms")
+    print(f"Tiết kiệm mỗi request:     {(per_request_build - per_request_registry) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,54 @@
+"""
+So sánh render SVG trong process (core.svg_render) với gọi xmindmark CLI (core.utils.xmindmark_to_svg)
+cho các map từ 10 đến 5000 node. Bỏ qua CLI nếu máy chưa cài `xmindmark`.
+
+Chạy: python -m benchmarks.bench_svg_render [số lần lặp]
+"""
+import os
+import random
+import shutil
+import sys
+import time
+
+from core.svg_render import render_svg
+from core.utils import xmindmark_to_svg
+
+SIZES = [10, 100, 500, 1000, 5000]
+
+
+def make_map(node_count: int, max_depth: int = 5, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = ["Sơ đồ kiểm thử"]
+    depth = 0
+    for i in range(node_count - 1):
+        depth = rng.randint(0, min(depth + 1, max_depth)) if i else 0
+        lines.append(f"{'  ' * depth}- Nút {i} {rng.choice(['kế hoạch', 'mục tiêu', 'kỹ năng', 'tài nguyên'])}")
+    return "\n".join(lines)
+
+
+def _measure(func, content: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(repeat: int = 5):
+    has_cli = shutil.which("xmindmark") is not None
+    if not has_cli:
+        print("Không tìm thấy xmindmark CLI, chỉ đo renderer trong process")
+    print(f"{'nodes':>6} {'in-process':>12} {'cli':>12}")
+    for size in SIZES:
+        content = make_map(size)
+        native = _measure(render_svg, content, repeat)
+        cli = "-"
+        if has_cli:
+            # CLI để lại file trong static/output_svg, dọn sau mỗi lần đo
+            def run_cli(text):
+                os.remove(xmindmark_to_svg(text))
+            cli = f"{_measure(run_cli, content, repeat) * 1000:.1f} ms"
+        print(f"{size:>6} {native * 1000:>9.1f} ms {cli:>12}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
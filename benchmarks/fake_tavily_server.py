@@ -0,0 +1,59 @@
+"""
+Server giả lập Tavily /search để đo và kiểm tra lớp search async (cache, single-flight,
+deadline) mà không cần mạng.
+
+Chạy: python -m benchmarks.fake_tavily_server [port] [độ trễ giây]
+Sau đó đặt TAVILY_BASE_URL=http://127.0.0.1:<port> khi chạy app.
+"""
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTavilyHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    request_count = 0
+
+    def do_POST(self):
+        if self.path != "/search":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        type(self).request_count += 1
+        time.sleep(self.delay)
+
+        query = body.get("query", "")
+        payload = {
+            "query": query,
+            "results": [
+                {
+                    "title": f"Kết quả {i} cho {query}",
+                    "url": f"http://fake.local/{i}",
+                    "content": f"Tóm tắt {i}",
+                    "raw_content": f"Nội dung trang {i} về {query}.\n\nĐoạn chi tiết số {i}.",
+                }
+                for i in range(1, body.get("max_results", 3) + 1)
+            ],
+        }
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"[fake-tavily #{self.request_count}] {format % args}\n")
+
+
+def serve(port: int = 8765, delay: float = 0.0) -> ThreadingHTTPServer:
+    FakeTavilyHandler.delay = delay
+    return ThreadingHTTPServer(("127.0.0.1", port), FakeTavilyHandler)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    print(f"Fake Tavily on http://127.0.0.1:{port} (delay {delay}s)")
+    serve(port, delay).serve_forever()
@@ -0,0 +1,172 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from core.tokens import count_tokens
+
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", 4000))
+# Khi chunk hiện tại đã đầy tới tỉ lệ này, heading cấp lớn luôn mở chunk mới. Ranh giới
+# chunk bám theo cấu trúc nên sửa một mục không làm xê dịch các chunk phía sau,
+# nhờ đó kết quả đã cache của các chunk không đổi vẫn dùng lại được.
+CHUNK_ANCHOR_MIN_FILL = float(os.getenv("CHUNK_ANCHOR_MIN_FILL", 0.6))
+
+_HEADING_PATTERNS = [
+    re.compile(r"^#{1,6}\s+\S"),                                        # Markdown
+    re.compile(r"^[IVXLCDM]{1,7}[\.\)]\s+\S"),                          # I. II. III)
+    re.compile(r"^\d{1,3}(\.\d{1,3}){0,4}[\.\)]\s+\S"),                 # 1. / 1.2. / 1.2.3)
+    re.compile(r"^\d{1,3}(\.\d{1,3}){1,4}\s+\S"),                       # 1.2 / 1.2.3
+    re.compile(r"^(chương|phần|mục|điều|bài|chapter|section|part)\s+[\dIVXLCDM]+", re.IGNORECASE),
+]
+# Heading cấp lớn (Markdown #/##, số La Mã, Chương/Phần) dùng làm điểm neo ranh giới chunk
+_ANCHOR_PATTERN = re.compile(r"^(#{1,2}\s|[IVXLCDM]{1,7}[\.\)]\s|(chương|phần|chapter|part)\s)", re.IGNORECASE)
+BULLET_PATTERN = re.compile(r"^([-*+•●▪◦]|[a-zđ]\)|\([a-zđ0-9]+\))\s+")
+_SENTENCE_END = re.compile(r"(?<=[\.\!\?;:…])\s+|\s+(?=[•●▪◦]\s)")
+_MAX_HEADING_WORDS = 15
+
+
+@dataclass
+class _Section:
+    heading: str = ""
+    blocks: List[str] = field(default_factory=list)
+
+    def text(self) -> str:
+        parts = [self.heading] if self.heading else []
+        return "\n".join(parts + self.blocks)
+
+
+def is_heading(line: str) -> bool:
+    if len(line.split()) > _MAX_HEADING_WORDS or BULLET_PATTERN.match(line):
+        return False
+    if any(p.match(line) for p in _HEADING_PATTERNS):
+        return True
+    # Dòng in hoa ngắn (thường là tiêu đề trong PDF)
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters)
+
+
+def _parse_sections(text: str) -> List[_Section]:
+    """Tách văn bản thành các section: mỗi section gồm một heading và các block (đoạn văn / bullet)"""
+    sections = [_Section()]
+    paragraph: List[str] = []
+
+    def flush_paragraph():
+        if paragraph:
+            sections[-1].blocks.append(" ".join(paragraph))
+            paragraph.clear()
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            flush_paragraph()
+        elif is_heading(line):
+            flush_paragraph()
+            sections.append(_Section(heading=line))
+        elif BULLET_PATTERN.match(line):
+            flush_paragraph()
+            paragraph.append(line)
+        else:
+            paragraph.append(line)
+    flush_paragraph()
+
+    return [s for s in sections if s.heading or s.blocks]
+
+
+def _split_oversized(block: str, budget: int) -> List[str]:
+    """Chia block vượt budget theo câu/bullet, cuối cùng mới cắt theo từ"""
+    pieces = [p for p in _SENTENCE_END.split(block) if p.strip()]
+    if len(pieces) == 1:
+        words = block.split()
+        step = max(1, int(budget / 1.3))
+        pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        if len(pieces) == 1:
+            return pieces
+    return _pack(pieces, budget, separator=" ")
+
+
+def _pack(pieces: List[str], budget: int, separator: str = "\n", anchor_min_fill: float = 1.0) -> List[str]:
+    """
+    Gộp tham lam các mảnh liên tiếp sao cho mỗi chunk gần chạm budget nhất.
+    Mảnh bắt đầu bằng heading cấp lớn mở chunk mới nếu chunk hiện tại đã đạt anchor_min_fill.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and current_tokens >= budget * anchor_min_fill and _ANCHOR_PATTERN.match(piece):
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        if tokens > budget:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(piece, budget))
+            continue
+        if current and current_tokens + tokens > budget:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _section_pieces(section: _Section, budget: int) -> List[str]:
+    """Section vừa budget giữ nguyên; section lớn được chia theo block, lặp lại heading làm ngữ cảnh"""
+    text = section.text()
+    if count_tokens(text) <= budget:
+        return [text]
+
+    heading_tokens = count_tokens(section.heading)
+    parts = _pack(section.blocks, max(1, budget - heading_tokens - 5))
+    if not section.heading:
+        return parts
+    return [section.heading + "\n" + part if i == 0 else f"{section.heading} (tiếp)\n{part}"
+            for i, part in enumerate(parts)]
+
+
+def chunk_document(text: str, token_budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """
+    Chia tài liệu theo cấu trúc (heading, mục La Mã/đánh số, bullet, đoạn văn)
+    rồi gộp lại thành ít chunk nhất có thể, mỗi chunk không vượt token_budget.
+    """
+    text = text.strip()
+    if not text:
+        return []
+
+    pieces: List[str] = []
+    for section in _parse_sections(text):
+        pieces.extend(_section_pieces(section, token_budget))
+
+    return _pack(pieces, token_budget, separator="\n\n", anchor_min_fill=CHUNK_ANCHOR_MIN_FILL)
+
+
+def build_outline(text: str, token_budget: int = 600) -> str:
+    """
+    Dàn ý ngắn của tài liệu (các heading, kèm phần mở đầu nếu ít heading),
+    đủ để sinh tiêu đề mà không phải gửi toàn bộ văn bản.
+    """
+    sections = _parse_sections(text)
+    lines: List[str] = []
+    used = 0
+
+    headings = [s.heading for s in sections if s.heading]
+    if len(headings) < 3:
+        intro = " ".join(block for s in sections[:2] for block in s.blocks)
+        intro = _split_oversized(intro, token_budget // 2)[0] if intro else ""
+        if intro:
+            lines.append(intro)
+            used += count_tokens(intro)
+
+    for heading in headings:
+        tokens = count_tokens(heading)
+        if used + tokens > token_budget:
+            break
+        lines.append(heading)
+        used += tokens
+
+    return "\n".join(lines) or text[:2000]
@@ -0,0 +1,139 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from core.relevance import fold_diacritics
+from core.search_context import remove_near_duplicates
+from core.text_processing import PAGE_BREAK
+from core.tokens import count_tokens
+
+CLEANUP_ENABLED = os.getenv("CLEANUP_ENABLED", "true").lower() not in ("0", "false", "no")
+# Một dòng ở đầu/cuối trang được coi là header/footer nếu lặp lại ở ít nhất tỉ lệ trang này
+CLEANUP_REPEAT_RATIO = float(os.getenv("CLEANUP_REPEAT_RATIO", 0.5))
+CLEANUP_MIN_REPEAT_PAGES = 3
+# Số dòng không rỗng ở đầu và cuối mỗi trang được xét là header/footer, và độ dài tối đa (số từ) của chúng
+_EDGE_LINES = 2
+_MAX_FURNITURE_WORDS = 15
+# Chỉ loại trùng lặp các đoạn đủ dài; tiêu đề ngắn lặp lại (vd "Ví dụ") là cấu trúc hợp lệ
+_DEDUPE_MIN_WORDS = 8
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"[ \t ]+")
+_PAGE_NUMBER = re.compile(r"^(trang|page|p\.)?\s*[-–]?\s*\d{1,4}\s*[-–]?\s*((/|of|trên)\s*\d{1,4})?$", re.IGNORECASE)
+_TOC_LEADER = re.compile(r"(\.\s?){4,}\s*\d{1,4}\s*$|…{2,}\s*\d{1,4}\s*$")
+_HYPHEN_BREAK = re.compile(r"([^\W\d_])-\n[ \t]*([^\W\d_])")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _line_key(line: str) -> str:
+    # Bỏ số (số trang, ngày) để "Báo cáo 2024 - Trang 3" và "... Trang 4" được coi là một dòng
+    return _DIGITS.sub("#", _SPACES.sub(" ", line.strip().lower()))
+
+
+def _edge_indices(lines: List[str]) -> List[int]:
+    # Lấy đúng các dòng ở mép trang trước rồi mới bỏ dòng dài, để dòng ngắn giữa trang không bị coi là mép
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(non_empty[:_EDGE_LINES] + non_empty[-_EDGE_LINES:])
+    return sorted(i for i in edges if len(lines[i].split()) <= _MAX_FURNITURE_WORDS)
+
+
+def _strip_page_furniture(pages: List[str], stats: Dict[str, int]) -> List[str]:
+    """Xoá header/footer lặp lại giữa các trang và dòng chỉ chứa số trang ở đầu/cuối trang"""
+    page_lines = [page.split("\n") for page in pages]
+    repeated = set()
+    if len(pages) >= CLEANUP_MIN_REPEAT_PAGES:
+        counts = Counter()
+        for lines in page_lines:
+            counts.update({_line_key(lines[i]) for i in _edge_indices(lines)})
+        min_pages = max(CLEANUP_MIN_REPEAT_PAGES, math.ceil(CLEANUP_REPEAT_RATIO * len(pages)))
+        repeated = {key for key, count in counts.items() if count >= min_pages}
+
+    cleaned = []
+    for lines in page_lines:
+        drop = set()
+        for i in _edge_indices(lines):
+            if _line_key(lines[i]) in repeated:
+                drop.add(i)
+                stats["repeated_lines"] += 1
+            elif _PAGE_NUMBER.match(lines[i].strip()):
+                drop.add(i)
+                stats["page_numbers"] += 1
+        cleaned.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return cleaned
+
+
+def _dehyphenate(text: str, stats: Dict[str, int]) -> str:
+    def join(match: re.Match) -> str:
+        # Chỉ nối khi phần sau viết thường (từ bị ngắt dòng), giữ nguyên "COVID-\n19", "A-\nB"
+        if not match.group(2).islower():
+            return match.group(0)
+        stats["dehyphenated"] += 1
+        return match.group(1) + match.group(2)
+
+    return _HYPHEN_BREAK.sub(join, text)
+
+
+def _collapse_whitespace(text: str, stats: Dict[str, int]) -> str:
+    lines = []
+    for line in text.split("\n"):
+        if _TOC_LEADER.search(line):
+            stats["toc_lines"] += 1
+            continue
+        indent = line[: len(line) - len(line.lstrip(" \t"))]
+        lines.append(indent + _SPACES.sub(" ", line.strip()))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def split_paragraphs(text: str) -> Tuple[List[str], str]:
+    """Tách đoạn theo dòng trống; văn bản PDF thường không có dòng trống thì mỗi dòng là một đoạn"""
+    separator = "\n\n" if "\n\n" in text else "\n"
+    return text.split(separator), separator
+
+
+def _dedupe_paragraphs(text: str, stats: Dict[str, int]) -> str:
+    paragraphs, separator = split_paragraphs(text)
+    seen = set()
+    candidates: List[int] = []
+    drop = set()
+    for i, paragraph in enumerate(paragraphs):
+        if len(paragraph.split()) < _DEDUPE_MIN_WORDS:
+            continue
+        key = _SPACES.sub(" ", fold_diacritics(paragraph).lower().strip())
+        if key in seen:
+            drop.add(i)
+            continue
+        seen.add(key)
+        candidates.append(i)
+
+    kept = set(remove_near_duplicates([paragraphs[i] for i in candidates]))
+    drop.update(index for position, index in enumerate(candidates) if position not in kept)
+    stats["duplicate_paragraphs"] += len(drop)
+    return separator.join(p for i, p in enumerate(paragraphs) if i not in drop)
+
+
+def clean_document(text: str) -> Tuple[str, dict]:
+    """
+    Làm sạch văn bản trích xuất trước khi gửi LLM: bỏ header/footer lặp lại giữa các trang,
+    số trang, dòng mục lục có dấu chấm dẫn, nối từ bị ngắt bằng gạch nối, gom khoảng trắng
+    và bỏ các đoạn trùng / gần trùng. Trả về (văn bản đã làm sạch, thống kê kèm số token tiết kiệm).
+    """
+    stats: Dict[str, int] = Counter()
+    pages = _strip_page_furniture(text.split(PAGE_BREAK), stats)
+    cleaned = _dehyphenate("\n".join(pages), stats)
+    cleaned = _collapse_whitespace(cleaned, stats)
+    cleaned = _dedupe_paragraphs(cleaned, stats)
+
+    tokens_before = count_tokens(text)
+    tokens_after = count_tokens(cleaned)
+    return cleaned, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "removed_repeated_lines": stats["repeated_lines"],
+        "removed_page_numbers": stats["page_numbers"],
+        "removed_toc_lines": stats["toc_lines"],
+        "dehyphenated_words": stats["dehyphenated"],
+        "removed_duplicate_paragraphs": stats["duplicate_paragraphs"],
+    }
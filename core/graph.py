@@ -1,35 +1,116 @@
-from agent.graph import build_graph
+from agent.graph import get_graph
+from agent.utils.nodes import CHUNK_DONE_EVENT
+from core.llm_handle import INTERMEDIATE_MERGE_TAG
+from core.ingest import BlobRef
 
-def generate_xmindmark_langgraph(text: str, user_requirements: str) -> str:
-    graph = build_graph()
-    response = graph.invoke({
-        "input_text": f"""{text}""", 
+# Các node được báo stage started/finished trên stream
+STREAM_STAGES = ["clean_document", "filter_relevance", "check_split", "split_chunks", "generate_global_title", "merge_xmind", "generate_direct"]
+
+
+def _initial_state(text: str | BlobRef, user_requirements: str) -> dict:
+    # Tài liệu đã lưu thành blob chỉ được truyền dưới dạng tham chiếu
+    is_ref = isinstance(text, dict)
+    return {
+        "input_text": "" if is_ref else text,
+        "input_ref": text if is_ref else None,
         "user_requirements": f"""{user_requirements}""",
         "need_split": False,
         "chunks": [],
         "xmindmark_chunks_content": [],
+        "chunk_cache_hits": [],
         "xmindmark_final": "",
-        "global_title": ""
-    })
+        "global_title": "",
+        "cleanup_stats": {},
+        "relevance_stats": {}
+    }
+
+
+def stream_event(event_type: str, **metadata) -> dict:
+    """Event có kiểu cho NDJSON stream (ngoài các delta nội dung dạng chuỗi)"""
+    return {"type": event_type, "metadata": metadata}
+
+
+def _build_config(variant: str, **configurable) -> dict:
+    """Config riêng cho từng request, graph đã compile được dùng lại"""
+    return {
+        "run_name": f"xmindmark_{variant}",
+        "configurable": configurable,
+    }
+
+
+async def generate_xmindmark_langgraph(text: str | BlobRef, user_requirements: str, split_mode: str | None = None, variant: str = "default", keep_ratio: float | None = None) -> str:
+    graph = get_graph(variant)
+    response = await graph.ainvoke(
+        _initial_state(text, user_requirements),
+        config=_build_config(variant, split_mode=split_mode, keep_ratio=keep_ratio),
+    )
     return response["xmindmark_final"]
 
 
-async def generate_xmindmark_langgraph_stream(text: str, user_requirements: str):
-    graph = build_graph()
-    async for event in graph.astream_events({
-        "input_text": f"""{text}""", 
-        "user_requirements": f"""{user_requirements}""",
-        "need_split": False,
-        "chunks": [],
-        "xmindmark_chunks_content": [],
-        "xmindmark_final": "",
-        "global_title": ""
-    }, version="v2"):
-        if (event["event"] == "on_chat_model_stream" and 
-            event.get("metadata", {}).get('langgraph_node','') in ["merge_xmind", "generate_direct"]):
+async def generate_xmindmark_langgraph_stream(text: str | BlobRef, user_requirements: str, split_mode: str | None = None, variant: str = "default", keep_ratio: float | None = None):
+    """
+    Stream kết quả graph: delta nội dung của node cuối (merge_xmind / generate_direct),
+    xen kẽ các event stage (bước bắt đầu/kết thúc) và chunk (XMindMark của từng phần).
+    """
+    graph = get_graph(variant)
+    streamed = False
+    total_chunks = None
+    completed_chunks = 0
+    cached_chunks = 0
+    async for event in graph.astream_events(
+        _initial_state(text, user_requirements),
+        config=_build_config(variant, split_mode=split_mode, keep_ratio=keep_ratio),
+        version="v2",
+    ):
+        kind = event["event"]
+        node = event.get("metadata", {}).get('langgraph_node','')
+
+        if (kind == "on_chat_model_stream" and 
+            node in ["merge_xmind", "generate_direct"] and
+            INTERMEDIATE_MERGE_TAG not in event.get("tags", [])):
             data = event.get("data", {})
             if "chunk" in data and data["chunk"].content:
+                streamed = True
                 yield data["chunk"].content
+
+        elif kind == "on_custom_event" and event["name"] == CHUNK_DONE_EVENT:
+            completed_chunks += 1
+            cached_chunks += event["data"]["cached"]
+            yield stream_event(
+                "chunk",
+                chunk_index=event["data"]["chunk_index"],
+                completed=completed_chunks,
+                total=total_chunks,
+                cached=event["data"]["cached"],
+                xmindmark=event["data"]["xmindmark"],
+            )
+
+        elif kind == "on_chain_start" and event["name"] == node and node in STREAM_STAGES:
+            yield stream_event("stage", stage=node, status="started")
+
+        elif kind == "on_chain_end" and event["name"] == node and node in STREAM_STAGES:
+            output = event.get("data", {}).get("output") or {}
+            if node == "split_chunks":
+                total_chunks = len(output.get("chunks", []))
+            yield stream_event("stage", stage=node, status="finished")
+
+            if node == "clean_document" and output.get("cleanup_stats"):
+                yield stream_event("metadata", cleanup=output["cleanup_stats"])
+            elif node == "filter_relevance" and output.get("relevance_stats"):
+                yield stream_event("metadata", relevance=output["relevance_stats"])
+
+            # Node không gọi LLM (vd. merge local) thì gửi nguyên kết quả cuối
+            if node in ["merge_xmind", "generate_direct"] and not streamed and output.get("xmindmark_final"):
+                yield output["xmindmark_final"]
+
+    if completed_chunks:
+        # Gộp vào metadata của chunk cuối trên NDJSON stream
+        yield stream_event(
+            "metadata",
+            chunk_cache_hits=cached_chunks,
+            chunk_count=completed_chunks,
+            chunk_cache_hit_ratio=round(cached_chunks / completed_chunks, 4),
+        )
                 
     
 # async def test_stream():
@@ -0,0 +1,180 @@
+import codecs
+import hashlib
+import mmap
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, List, Union
+
+from docx import Document
+from typing_extensions import TypedDict
+
+from core.cache import CACHE_DIR
+from core.render_cache import sweep_dir
+from core.text_processing import EXTRACTOR_VERSION, PAGE_BREAK, iter_pdf_pages, pdf_page_count
+
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(CACHE_DIR, "blobs"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+MAX_DOCUMENT_PAGES = int(os.getenv("MAX_DOCUMENT_PAGES", 1000))
+INGEST_CHUNK_BYTES = 1024 * 1024
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+BLOB_MAX_AGE_SECONDS = int(os.getenv("BLOB_MAX_AGE_SECONDS", 24 * 3600))
+
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "md")
+
+
+class IngestLimitError(Exception):
+    """Tài liệu vượt giới hạn dung lượng / số trang (API trả về 413)"""
+
+
+class BlobRef(TypedDict):
+    """Tham chiếu tới một đoạn văn bản UTF-8 lưu trên đĩa: file và khoảng byte [start, end)"""
+    path: str
+    start: int
+    end: int
+
+
+@dataclass
+class SpooledUpload:
+    path: str
+    sha256: str
+    size: int
+    extension: str
+
+
+def read_blob(ref: BlobRef) -> str:
+    """Đọc đúng đoạn được tham chiếu qua mmap, không nạp cả file vào bộ nhớ"""
+    if ref["end"] <= ref["start"]:
+        return ""
+    with open(ref["path"], "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped[ref["start"]:ref["end"]].decode("utf-8")
+
+
+def resolve_text(value: Union[str, BlobRef]) -> str:
+    """Văn bản trong state có thể là chuỗi hoặc BlobRef; trả về nội dung dạng chuỗi"""
+    return read_blob(value) if isinstance(value, dict) else value
+
+
+class BlobWriter:
+    """Ghi lần lượt các đoạn văn bản vào một file blob, mỗi lần ghi trả về BlobRef của đoạn đó"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "wb")
+        self._offset = 0
+
+    def append(self, text: str) -> BlobRef:
+        data = text.encode("utf-8")
+        self._file.write(data)
+        ref = BlobRef(path=self.path, start=self._offset, end=self._offset + len(data))
+        self._offset += len(data)
+        return ref
+
+    def close(self) -> BlobRef:
+        """Đóng file, trả về BlobRef của toàn bộ nội dung đã ghi"""
+        self._file.close()
+        return BlobRef(path=self.path, start=0, end=self._offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self._file.closed:
+            self._file.close()
+
+
+def write_blobs(texts: Iterable[str], prefix: str = "chunks") -> List[BlobRef]:
+    """Lưu danh sách đoạn văn bản vào một file blob mới, trả về BlobRef của từng đoạn"""
+    with BlobWriter(os.path.join(BLOB_DIR, prefix, f"{uuid.uuid4().hex}.txt")) as writer:
+        return [writer.append(text) for text in texts]
+
+
+async def spool_upload(uploaded_file, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    """
+    Chép file upload ra đĩa theo từng khối (vừa chép vừa băm SHA-256), dừng và báo lỗi ngay
+    khi vượt max_bytes. File được lưu theo hash nên upload trùng chỉ giữ một bản.
+    """
+    filename = getattr(uploaded_file, "filename", None) or getattr(uploaded_file, "name", None)
+    if filename is None:
+        raise Exception("Không thể xác định tên file.")
+    extension = filename.split('.')[-1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise Exception(f"Định dạng file '{extension}' không được hỗ trợ.")
+
+    upload_dir = os.path.join(BLOB_DIR, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    part_path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(part_path, "wb") as out:
+            while True:
+                block = await uploaded_file.read(INGEST_CHUNK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise IngestLimitError(f"File vượt quá giới hạn {max_bytes} bytes")
+                digest.update(block)
+                out.write(block)
+        sha256 = digest.hexdigest()
+        path = os.path.join(upload_dir, f"{sha256}.{extension}")
+        os.replace(part_path, path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return SpooledUpload(path=path, sha256=sha256, size=size, extension=extension)
+
+
+def _validate_utf8(path: str):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(INGEST_CHUNK_BYTES)
+            decoder.decode(block, final=not block)
+            if not block:
+                break
+
+
+def extract_upload_to_blob(upload: SpooledUpload, max_pages: int = MAX_DOCUMENT_PAGES) -> BlobRef:
+    """
+    Trích xuất văn bản của file đã spool thành một blob trên đĩa, ghi dần từng trang / đoạn
+    nên bộ nhớ không tăng theo kích thước tài liệu. Blob được giữ theo hash file để upload
+    lại không phải trích xuất. File .md được tham chiếu trực tiếp, không copy.
+    """
+    if upload.extension == "md":
+        _validate_utf8(upload.path)
+        return BlobRef(path=upload.path, start=0, end=upload.size)
+
+    if upload.extension == "pdf":
+        page_count = pdf_page_count(upload.path)
+        if page_count > max_pages:
+            raise IngestLimitError(f"Tài liệu có {page_count} trang, vượt quá giới hạn {max_pages} trang")
+
+    text_path = os.path.join(BLOB_DIR, "text", f"{upload.sha256}.{EXTRACTOR_VERSION}.txt")
+    if os.path.exists(text_path):
+        os.utime(text_path)
+        return BlobRef(path=text_path, start=0, end=os.path.getsize(text_path))
+
+    tmp_path = f"{text_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with BlobWriter(tmp_path) as writer:
+            if upload.extension == "pdf":
+                for page_number, page_text in enumerate(iter_pdf_pages(upload.path)):
+                    writer.append(page_text if page_number == 0 else PAGE_BREAK + page_text)
+            else:
+                for paragraph in Document(upload.path).paragraphs:
+                    writer.append(paragraph.text + "\n")
+            ref = writer.close()
+        os.replace(tmp_path, text_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return BlobRef(path=text_path, start=ref["start"], end=ref["end"])
+
+
+def sweep_blobs():
+    """Xoá blob (file upload, văn bản trích xuất, chunk) quá hạn hoặc vượt dung lượng, cũ nhất trước"""
+    if os.path.isdir(BLOB_DIR):
+        sweep_dir(BLOB_DIR, BLOB_MAX_BYTES, BLOB_MAX_AGE_SECONDS)
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import asdict, replace
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.cache import CACHE_DIR
+from core.graph import generate_xmindmark_langgraph
+from core.ingest import MAX_UPLOAD_BYTES, SpooledUpload, extract_upload_to_blob
+from core.llm_handle import agenerate_xmindmark_no_docs, agenerate_xmindmark_with_search
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# File upload của job được giữ ở đây (ngoài BLOB_DIR nên sweep_blobs không xoá) cho tới khi job kết thúc
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", os.path.join(CACHE_DIR, "job_uploads"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Tổng dung lượng tối đa của một request gửi nhiều file tới /api/jobs/docs (mỗi file vẫn giới hạn MAX_UPLOAD_BYTES)
+JOB_BATCH_MAX_BYTES = int(os.getenv("JOB_BATCH_MAX_BYTES", 20 * MAX_UPLOAD_BYTES))
+# Worker batch không nhận job mới khi số request tương tác đang chạy >= ngưỡng này
+JOB_YIELD_TO_INTERACTIVE = int(os.getenv("JOB_YIELD_TO_INTERACTIVE", 1))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 5))
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+_interactive_in_flight = 0
+
+
+@asynccontextmanager
+async def interactive_request():
+    """Đánh dấu một request tương tác đang chạy; worker batch nhường khi có request tương tác"""
+    global _interactive_in_flight
+    _interactive_in_flight += 1
+    try:
+        yield
+    finally:
+        _interactive_in_flight -= 1
+
+
+async def _run_docs_job(payload: dict) -> str:
+    upload = SpooledUpload(**payload["upload"])
+    document = await asyncio.to_thread(extract_upload_to_blob, upload)
+    return await generate_xmindmark_langgraph(
+        document,
+        payload["user_requirements"],
+        payload.get("split_mode"),
+        keep_ratio=payload.get("keep_ratio"),
+    )
+
+
+async def _run_requirements_job(payload: dict) -> str:
+    if payload.get("enable_search"):
+        return await agenerate_xmindmark_with_search(payload["user_requirements"], payload.get("search_backend", "tavily"))
+    return await agenerate_xmindmark_no_docs(payload["user_requirements"])
+
+
+JOB_HANDLERS: Dict[str, Callable[[dict], Awaitable[str]]] = {
+    "docs": _run_docs_job,
+    "requirements": _run_requirements_job,
+}
+
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(JOB_UPLOAD_DIR, job_id)
+
+
+class JobQueue:
+    """
+    Hàng đợi job sinh mindmap lưu trong SQLite: job, trạng thái và kết quả còn nguyên
+    sau khi restart. Các worker chạy trong event loop của app, lấy job theo priority
+    (cao trước) rồi thời điểm tạo.
+    """
+
+    def __init__(self, path: str, workers: int = JOB_WORKERS):
+        self.path = path
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "payload TEXT NOT NULL, label TEXT NOT NULL DEFAULT '', result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority DESC, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def submit(self, kind: str, payload: dict, priority: int = 0, label: str = "", job_id: Optional[str] = None) -> str:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Loại job '{kind}' không tồn tại")
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO jobs (id, kind, status, priority, payload, label, created_at) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, priority, json.dumps(payload, ensure_ascii=False), label, time.time()),
+            )
+        if self._wakeup is not None:
+            # submit có thể chạy trong thread (asyncio.to_thread); asyncio.Event không thread-safe
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job_id
+
+    def submit_upload(self, upload: SpooledUpload, payload: dict, priority: int = 0, label: str = "") -> str:
+        """
+        Tạo job "docs" cho file đã spool. File được hard link (hoặc copy) vào thư mục riêng của job
+        để vẫn còn khi job phải chờ lâu trong hàng đợi hay app restart; thư mục bị xoá khi job kết thúc.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = _job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        path = os.path.join(job_dir, os.path.basename(upload.path))
+        try:
+            try:
+                os.link(upload.path, path)
+            except OSError:
+                shutil.copy2(upload.path, path)
+            return self.submit("docs", {**payload, "upload": asdict(replace(upload, path=path))}, priority, label, job_id)
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    def get(self, job_id: str, with_result: bool = False) -> Optional[dict]:
+        jobs = self.get_many([job_id], with_result)
+        return jobs[0] if jobs else None
+
+    def get_many(self, job_ids: List[str], with_result: bool = False) -> List[dict]:
+        if not job_ids:
+            return []
+        columns = "id, kind, status, priority, label, error, created_at, started_at, finished_at"
+        if with_result:
+            columns += ", result"
+        placeholders = ",".join("?" * len(job_ids))
+        with self._lock:
+            rows = self._db().execute(f"SELECT {columns} FROM jobs WHERE id IN ({placeholders})", job_ids).fetchall()
+        by_id = {row["id"]: dict(row) for row in rows}
+        return [by_id[job_id] for job_id in job_ids if job_id in by_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """Huỷ job còn trong hàng đợi; job đang chạy hoặc đã xong thì không huỷ được"""
+        with self._lock:
+            cursor = self._db().execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        if cursor.rowcount > 0:
+            shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+        return cursor.rowcount > 0
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"]))
+            return row
+
+    def _finish(self, job_id: str, result: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("failed" if error else "done", result, error, time.time(), job_id),
+            )
+        shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+    async def _worker(self, worker_index: int):
+        while True:
+            try:
+                await self._run_next(worker_index)
+            except Exception as e:
+                # Lỗi SQLite (vd. "database is locked") không được làm mất worker: log, chờ rồi thử lại
+                logger.exception(f"Worker {worker_index} lỗi: {e}")
+                await asyncio.sleep(JOB_POLL_SECONDS)
+
+    async def _run_next(self, worker_index: int):
+        # Nhường tài nguyên (LLM, CPU) cho request tương tác
+        while _interactive_in_flight >= JOB_YIELD_TO_INTERACTIVE:
+            await asyncio.sleep(0.5)
+
+        row = await asyncio.to_thread(self._claim_next)
+        if row is None:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        logger.info(f"Worker {worker_index} chạy job {row['id']} ({row['kind']})")
+        try:
+            result = await JOB_HANDLERS[row["kind"]](json.loads(row["payload"]))
+        except asyncio.CancelledError:
+            # App tắt giữa chừng: trả job về hàng đợi để chạy lại lần sau
+            await asyncio.to_thread(self._requeue, row["id"])
+            raise
+        except Exception as e:
+            logger.warning(f"Job {row['id']} lỗi: {e}")
+            await asyncio.to_thread(self._finish, row["id"], None, f"{type(e).__name__}: {e}")
+            return
+        await asyncio.to_thread(self._finish, row["id"], result)
+
+    def _requeue(self, job_id: str):
+        with self._lock:
+            self._db().execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE id = ?", (job_id,))
+
+    def start(self):
+        """Khởi động worker; job còn 'running' từ lần chạy trước (app bị tắt đột ngột) được chạy lại"""
+        with self._lock:
+            self._db().execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_queue = JobQueue(JOBS_DB_PATH)
@@ -0,0 +1,81 @@
+import json
+from typing import List
+
+_WHITESPACE = " \t\r\n"
+
+
+class JsonStringArrayParser:
+    """
+    Parser tăng dần cho một mảng JSON chỉ chứa chuỗi: ["...", "...", ...].
+
+    Mỗi lần feed() trả về các chuỗi vừa đóng, để có thể xử lý chunk ngay khi
+    LLM vừa viết xong thay vì chờ toàn bộ response. Ký tự trước dấu "[" đầu tiên
+    (ví dụ ```json) được bỏ qua; mọi sai lệch khác so với JSON đều raise ValueError.
+    """
+
+    def __init__(self):
+        self.items: List[str] = []
+        self._state = "before_array"
+        self._buffer: List[str] = []
+        self._escaped = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str) -> List[str]:
+        completed: List[str] = []
+        for char in text:
+            state = self._state
+
+            if state == "in_string":
+                if self._escaped:
+                    self._escaped = False
+                    self._buffer.append(char)
+                elif char == "\\":
+                    self._escaped = True
+                    self._buffer.append(char)
+                elif char == '"':
+                    # strict=False: chấp nhận xuống dòng thật bên trong chuỗi
+                    item = json.loads('"' + "".join(self._buffer) + '"', strict=False)
+                    self._buffer.clear()
+                    self.items.append(item)
+                    completed.append(item)
+                    self._state = "after_value"
+                else:
+                    self._buffer.append(char)
+            elif state == "before_array":
+                if char == "[":
+                    self._state = "first_value"
+            elif char in _WHITESPACE:
+                continue
+            elif state in ("first_value", "value"):
+                if char == '"':
+                    self._state = "in_string"
+                elif char == "]" and state == "first_value":
+                    self._state = "done"
+                else:
+                    raise ValueError(f"Ký tự không hợp lệ {char!r}, cần một chuỗi JSON")
+            elif state == "after_value":
+                if char == ",":
+                    self._state = "value"
+                elif char == "]":
+                    self._state = "done"
+                else:
+                    raise ValueError(f"Ký tự không hợp lệ {char!r}, cần ',' hoặc ']'")
+            elif state == "done":
+                # Cho phép code fence đóng ``` sau mảng
+                if char != "`":
+                    raise ValueError(f"Dữ liệu thừa sau khi mảng đã đóng: {char!r}")
+        return completed
+
+    def close(self) -> List[str]:
+        if not self.done:
+            raise ValueError("Mảng JSON chưa được đóng")
+        return self.items
+
+
+def parse_json_string_array(text: str) -> List[str]:
+    parser = JsonStringArrayParser()
+    parser.feed(text)
+    return parser.close()
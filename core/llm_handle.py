@@ -1,7 +1,12 @@
 from core.llm_provider import llm, misa_llm
 from dotenv import load_dotenv
-from core.prompt import create_xmindmark_prompt, create_split_text_prompt, create_global_title_prompt, create_edit_prompt, create_merge_xmindmark_prompt, create_xmindmark_no_docs_prompt, create_xmindmark_with_search_prompt, create_edit_with_search_prompt
+from core.prompt import create_xmindmark_prompt, create_split_text_prompt, create_global_title_prompt, create_edit_prompt, create_merge_xmindmark_prompt, create_xmindmark_no_docs_prompt, create_xmindmark_with_search_prompt, create_edit_with_search_prompt, create_edit_patch_prompt, create_subtree_edit_prompt
 from core.tavily_search import tavily_search
+from core.retrieval import aretrieve_context
+from core.xmindmark import parse_xmindmark
+from core.xmindmark_patch import PatchError, apply_patch, parse_patch
+from core.xmindmark_scope import build_scope, format_path, locate_branch, splice_subtree
+from core.search_context import condense_search_context
 
 load_dotenv()
 
@@ -75,4 +80,179 @@ def generate_xmindmark_with_search(user_requirements: str) -> str:
     context = tavily_search(user_requirements)
     prompt = create_xmindmark_with_search_prompt(context, user_requirements)
     result = used_llm.invoke(prompt).content
-    return str(result) if result else ""
\ No newline at end of file
+    return str(result) if result else ""
+
+# ---------------------------------------------------------------------------
+# Async: dùng trong FastAPI handler và các node LangGraph để không chặn event loop.
+# Các hàm sync ở trên chỉ giữ lại cho script/Streamlit.
+# ---------------------------------------------------------------------------
+
+async def aedit_xmindmark_with_llm_search(user_requirements: str, edit_request: str, current_xmindmark: str, search_backend: str = "tavily"):
+    search_query = f"{user_requirements} {edit_request}".strip()
+    context = await aretrieve_context(search_query, search_backend)
+    if context is not None:
+        context = condense_search_context(context, search_query)
+
+    # Không có kết quả tìm kiếm (lỗi / quá deadline) thì chỉnh sửa như bình thường
+    if context is None:
+        prompt = create_edit_prompt(current_xmindmark, edit_request)
+    else:
+        prompt = create_edit_with_search_prompt(current_xmindmark, edit_request, context, user_requirements)
+
+    async for chunk in misa_llm.astream(prompt):
+        yield chunk.content
+
+
+async def aedit_xmindmark_with_llm(current_content: str, edit_request: str):
+    prompt = create_edit_prompt(current_content, edit_request)
+    async for chunk in used_llm.astream(prompt):
+        yield chunk.content
+
+
+async def aedit_xmindmark_patch_ops(current_content: str, edit_request: str) -> str:
+    prompt = create_edit_patch_prompt(current_content, edit_request)
+    result = (await used_llm.ainvoke(prompt)).content
+    return str(result) if result else ""
+
+
+async def aedit_xmindmark_with_patch(current_content: str, edit_request: str):
+    """
+    Chỉnh sửa bằng patch: LLM chỉ trả về các thao tác (add/remove/rename/move/replace),
+    server áp dụng lên map rồi stream từng thao tác và map đã sửa. Patch không áp dụng
+    được thì quay về sinh lại toàn bộ map.
+    """
+    try:
+        operations = parse_patch(await aedit_xmindmark_patch_ops(current_content, edit_request))
+        patched = apply_patch(current_content, operations)
+    except PatchError as e:
+        yield {"type": "metadata", "metadata": {"edit_mode": "full", "patch_error": str(e)}}
+        async for chunk in aedit_xmindmark_with_llm(current_content, edit_request):
+            yield chunk
+        return
+
+    yield {"type": "metadata", "metadata": {"edit_mode": "patch", "patch_operations": len(operations)}}
+    for op in operations:
+        yield {"type": "patch_op", "metadata": {"op": op}}
+    yield patched
+
+
+async def aedit_xmindmark_scoped(current_content: str, edit_request: str, target_path=None, edit_mode: str = "full"):
+    """
+    Chỉ gửi nhánh cần sửa (kèm dàn ý tổ tiên) cho LLM rồi ghép nhánh đã sửa vào map.
+    Không có target_path thì tự tìm nhánh theo nhãn được nhắc trong yêu cầu; không xác định
+    được nhánh thì sửa toàn bộ map như bình thường.
+    """
+    root = parse_xmindmark(current_content)
+    path = target_path if target_path is not None else locate_branch(root, edit_request)
+    try:
+        if path is None:
+            raise PatchError("không xác định được nhánh cần sửa")
+        subtree, outline = build_scope(root, path)
+    except PatchError as e:
+        yield {"type": "metadata", "metadata": {"edit_scope": "", "scope_error": str(e)}}
+        whole_map = aedit_xmindmark_with_patch if edit_mode == "patch" else aedit_xmindmark_with_llm
+        async for chunk in whole_map(current_content, edit_request):
+            yield chunk
+        return
+
+    metadata = {"edit_scope": format_path(path), "scope_nodes": subtree.count("\n") + 1}
+    if edit_mode == "patch":
+        try:
+            operations = parse_patch(await aedit_xmindmark_patch_ops(subtree, edit_request))
+            new_subtree = apply_patch(subtree, operations)
+        except PatchError as e:
+            operations, metadata["patch_error"] = None, str(e)
+        if operations is not None:
+            yield {"type": "metadata", "metadata": {**metadata, "edit_mode": "patch", "patch_operations": len(operations)}}
+            for op in operations:
+                yield {"type": "patch_op", "metadata": {"op": op}}
+            yield splice_subtree(current_content, path, new_subtree)
+            return
+
+    # Stream nhánh đang sửa dưới dạng event scope_delta (không tính vào nội dung map),
+    # map hoàn chỉnh được ghép và gửi khi LLM trả xong
+    yield {"type": "metadata", "metadata": {**metadata, "edit_mode": "full"}}
+    prompt = create_subtree_edit_prompt(subtree, outline, edit_request)
+    parts = []
+    async for chunk in used_llm.astream(prompt):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield {"type": "scope_delta", "metadata": {"edit_scope": metadata["edit_scope"], "text": chunk.content}}
+    new_subtree = "".join(parts)
+    if not new_subtree.strip():
+        new_subtree = subtree
+    yield splice_subtree(current_content, path, new_subtree)
+
+
+async def agenerate_xmindmark(text: str, user_requirements: str) -> str:
+    prompt = create_xmindmark_prompt(text, user_requirements)
+    result = (await used_llm.ainvoke(prompt)).content
+    return str(result) if result else ""
+
+
+async def agenerate_global_title(text: str, user_requirements: str) -> str:
+    prompt = create_global_title_prompt(text, user_requirements)
+    result = (await used_llm.ainvoke(prompt)).content
+    return str(result) if result else ""
+
+
+async def asplit_text_with_llm(text: str, user_requirements: str) -> str:
+    prompt = create_split_text_prompt(text, user_requirements)
+    result = (await used_llm.ainvoke(prompt)).content
+    return str(result) if result else ""
+
+
+async def asplit_text_with_llm_stream(text: str, user_requirements: str):
+    prompt = create_split_text_prompt(text, user_requirements)
+    async for chunk in used_llm.astream(prompt):
+        if chunk.content:
+            yield chunk.content
+
+
+# Tag cho các lần merge trung gian (tree merge), để phần stream bỏ qua token của chúng
+INTERMEDIATE_MERGE_TAG = "xmindmark_intermediate_merge"
+
+
+async def amerge_xmindmark_with_llm(chunks_text: str, global_title: str, user_requirements: str, intermediate: bool = False) -> str:
+    prompt = create_merge_xmindmark_prompt(chunks_text, global_title, user_requirements)
+    config = {"tags": [INTERMEDIATE_MERGE_TAG]} if intermediate else None
+    result = (await used_llm.ainvoke(prompt, config=config)).content
+    return str(result) if result else ""
+
+
+async def agenerate_xmindmark_no_docs_stream(user_requirements: str):
+    prompt = create_xmindmark_no_docs_prompt(user_requirements)
+    async for chunk in used_llm.astream(prompt):
+        if chunk.content:
+            yield chunk.content
+
+
+async def agenerate_xmindmark_no_docs(user_requirements: str) -> str:
+    prompt = create_xmindmark_no_docs_prompt(user_requirements)
+    result = (await used_llm.ainvoke(prompt)).content
+    return str(result) if result else ""
+
+
+def _search_or_no_docs_prompt(context, user_requirements: str) -> str:
+    # Chỉ giữ các đoạn liên quan nhất tới yêu cầu, vừa token budget
+    if context is not None:
+        context = condense_search_context(context, user_requirements)
+    # Không có kết quả tìm kiếm (lỗi / quá deadline) thì tạo mindmap không cần search
+    if context is None:
+        return create_xmindmark_no_docs_prompt(user_requirements)
+    return create_xmindmark_with_search_prompt(context, user_requirements)
+
+
+async def agenerate_xmindmark_with_search_stream(user_requirements: str, search_backend: str = "tavily"):
+    context = await aretrieve_context(user_requirements, search_backend)
+    prompt = _search_or_no_docs_prompt(context, user_requirements)
+    async for chunk in used_llm.astream(prompt):
+        if chunk.content:
+            yield chunk.content
+
+
+async def agenerate_xmindmark_with_search(user_requirements: str, search_backend: str = "tavily") -> str:
+    context = await aretrieve_context(user_requirements, search_backend)
+    prompt = _search_or_no_docs_prompt(context, user_requirements)
+    result = (await used_llm.ainvoke(prompt)).content
+    return str(result) if result else ""
@@ -7,6 +7,10 @@ load_dotenv()
 API_KEY = os.getenv("API_KEY", None)
 BASE_URL = os.getenv("BASE_URL", None)
 
+# Giới hạn của model đang dùng, dùng để quyết định có cần chia tài liệu hay không
+MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 8192))
+CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", 32768))
+
 misa_llm = ChatOpenAI(
     # model="misa-qwen3-235b",
     model="misa-qwen3-235b",
@@ -15,7 +19,7 @@ misa_llm = ChatOpenAI(
     default_headers={
         "App-Code": "fresher"
     },
-    max_tokens=8192,
+    max_tokens=MAX_TOKENS,
     temperature=0.4,
     extra_body={
         "service": "test-aiservice.misa.com.vn",
@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Process pool dùng chung cho các việc nặng CPU (render, trích xuất PDF), mặc định bằng số CPU
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS") or os.cpu_count() or 1)
+# Không fork trực tiếp từ process đang chạy event loop và các thread (lock bị giữ có thể làm worker treo)
+PROCESS_POOL_START_METHOD = os.getenv("PROCESS_POOL_START_METHOD", "forkserver")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD),
+            )
+        return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -1,3 +1,7 @@
+# Tăng mỗi khi sửa nội dung prompt, để cache kết quả cũ không còn được dùng
+PROMPT_VERSION = "5"
+
+
 def create_xmindmark_prompt(text: str, user_requirements: str) -> str:
     """Tạo prompt yêu cầu LLM trả về định dạng xmindmark"""
     prompt = f"""
@@ -49,7 +53,7 @@ Tiêu đề phải:
 
 Chỉ trả về tiêu đề, không giải thích thêm:
 
---- NỘI DUNG TÀI LIỆU ---
+--- DÀN Ý / NỘI DUNG TÀI LIỆU ---
 {text}
 --- KẾT THÚC ---
 """
@@ -81,14 +85,14 @@ Hãy phân tích nội dung bên dưới và chia thành các đoạn, mỗi đo
 ---
 
 **YÊU CẦU ĐẦU RA:**
-- **Chỉ trả về đúng một danh sách Python duy nhất.**
+- **Chỉ trả về đúng một mảng JSON duy nhất chứa các chuỗi.**
 - **Không được trả lời thêm bất kỳ giải thích, mô tả, tiêu đề nào.**
 - Định dạng ví dụ hợp lệ:
     ["Đoạn 1 về nội dung chính A", "Đoạn 2 liên quan đến nội dung B", "Đoạn 3 tổng kết hoặc mở rộng"]
 - Nếu chỉ cần một đoạn:
     ["Toàn bộ nội dung liên quan đến yêu cầu"]
 
-⚠️ **Lưu ý quan trọng:** Trả lời của bạn sẽ được phân tích bằng `eval(...)`, vì vậy định dạng phải hoàn toàn hợp lệ: **một danh sách Python chứa các chuỗi (`list[str]`)**.
+⚠️ **Lưu ý quan trọng:** Trả lời của bạn sẽ được phân tích bằng trình đọc JSON chuẩn, vì vậy định dạng phải hoàn toàn hợp lệ: **một mảng JSON chứa các chuỗi**, dùng dấu nháy kép `"` và escape ký tự `"` bên trong chuỗi thành `\\"`.
 
 ---
 
@@ -130,6 +134,63 @@ def create_edit_prompt(current_xmindmark: str, edit_request: str) -> str:  # Xó
     return prompt
 
 
+def create_edit_patch_prompt(current_xmindmark: str, edit_request: str) -> str:
+    """Tạo prompt yêu cầu LLM trả về danh sách thao tác sửa cây thay vì viết lại toàn bộ map"""
+    prompt = f"""
+Bạn cần chỉnh sửa sơ đồ tư duy XMindMark theo yêu cầu của người dùng. KHÔNG viết lại sơ đồ,
+chỉ trả về danh sách thao tác tối thiểu để biến sơ đồ hiện tại thành sơ đồ mong muốn.
+
+**NỘI DUNG XMINDMARK HIỆN TẠI:**
+{current_xmindmark}
+
+**YÊU CẦU CHỈNH SỬA:**
+{edit_request}
+
+**ĐỊA CHỈ NODE (path):**
+Chuỗi nhãn từ nhánh chính xuống node, nối bằng " > ", ghi đúng nhãn như trong sơ đồ.
+Ví dụ: "Nhánh chính 1 > Nhánh phụ 1.1". Path rỗng "" là node gốc (tiêu đề).
+
+**CÁC THAO TÁC:**
+- {{"op": "add", "path": "<node cha>", "label": "<nhãn mới>", "children": ["<nhãn con>", ...]}}
+- {{"op": "remove", "path": "<node cần xoá>"}}
+- {{"op": "rename", "path": "<node>", "label": "<nhãn mới>"}}
+- {{"op": "move", "path": "<node>", "to": "<node cha mới>"}}
+- {{"op": "replace", "path": "<node>", "subtree": "<nhánh mới ở định dạng XMindMark, dòng đầu là nhãn của node>"}}
+"add" cũng có thể dùng "subtree" thay cho "label"/"children" khi cần thêm nhánh nhiều tầng.
+
+**YÊU CẦU ĐẦU RA:**
+- Chỉ trả về đúng một mảng JSON các thao tác, không giải thích, không dùng ```.
+- Mỗi nút chỉ nên là từ khóa hoặc cụm từ ngắn, không phải câu dài.
+
+Ví dụ:
+[{{"op": "rename", "path": "Mục tiêu > IELTS 6.5", "label": "IELTS 7.0"}}, {{"op": "add", "path": "Kỹ năng", "label": "Phát âm"}}]
+"""
+    return prompt
+
+
+def create_subtree_edit_prompt(subtree_xmindmark: str, ancestors_outline: str, edit_request: str) -> str:
+    """Tạo prompt chỉnh sửa một nhánh của map, chỉ kèm dàn ý ngắn của phần còn lại làm ngữ cảnh"""
+    prompt = f"""
+Bạn cần chỉnh sửa MỘT NHÁNH trong sơ đồ tư duy XMindMark theo yêu cầu của người dùng.
+
+**VỊ TRÍ CỦA NHÁNH TRONG SƠ ĐỒ (chỉ để tham khảo, không chỉnh sửa):**
+{ancestors_outline}
+
+**NHÁNH CẦN CHỈNH SỬA:**
+{subtree_xmindmark}
+
+**YÊU CẦU CHỈNH SỬA:**
+{edit_request}
+
+**YÊU CẦU ĐẦU RA:**
+- Chỉ trả về nhánh đã chỉnh sửa ở định dạng XMindMark: dòng đầu là nhãn của nhánh (không có "- "),
+  các dòng tiếp theo bắt đầu bằng "- " và dùng tab để thể hiện cấp độ.
+- Không lặp lại các nhánh khác của sơ đồ, không giải thích, không dùng ```.
+- Mỗi nút chỉ nên là từ khóa hoặc cụm từ ngắn, không phải câu dài.
+"""
+    return prompt
+
+
 def create_merge_xmindmark_prompt(chunks_text: str, global_title: str, user_requirements: str) -> str:
     prompt = f"""
 Bạn là chuyên gia tạo sơ đồ tư duy. Nhiệm vụ của bạn là hợp nhất các phần sơ đồ riêng lẻ thành một sơ đồ tư duy hoàn chỉnh, mạch lạc và tối ưu. Tự quyết định số lượng nhánh chính, nhánh phụ và tầng dựa trên nội dung và yêu cầu. Nếu người dùng không yêu cầu, hãy tạo sơ đồ với lượng thông tin, số lượng nhánh một cách cô đọng và cốt lõi, tương ứng với domain mà người dùng đang quan tâm, đừng quá dài dòng gây rối, đặc biệt là những nhánh lớn.
@@ -0,0 +1,63 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Sequence
+
+_WORD = re.compile(r"\w+")
+
+# Hư từ tiếng Việt / tiếng Anh phổ biến (đã bỏ dấu), không mang nghĩa khi xếp hạng
+STOPWORDS = frozenset("""
+va cua la cac nhung mot co cho voi trong tren duoc nay khi thi de tu ve den hay
+hoac nhu cung da se dang rat nen ma neu vi bang theo tai do o ra vao lai con
+the a an and are as at be by for from has have in is it of on or that the to was
+were will with this these those not but can
+""".split())
+
+
+def fold_diacritics(text: str) -> str:
+    """Bỏ dấu tiếng Việt và chuyển chữ thường: "Quy Trình Đăng Ký" -> "quy trinh dang ky" """
+    text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str, bigrams: bool = True) -> List[str]:
+    """
+    Tách token cho xếp hạng: âm tiết đã bỏ dấu, loại hư từ. Tiếng Việt có từ ghép nhiều
+    âm tiết ("quy trình", "nhân sự") nên thêm bigram của các âm tiết liền kề.
+    """
+    syllables = _WORD.findall(fold_diacritics(text))
+    tokens = [s for s in syllables if s not in STOPWORDS and len(s) > 1]
+    if bigrams:
+        tokens += [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])
+                   if a not in STOPWORDS or b not in STOPWORDS]
+    return tokens
+
+
+class BM25:
+    """Okapi BM25 trên tập tài liệu đã tokenize"""
+
+    def __init__(self, documents: Sequence[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.doc_lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.doc_lengths) / len(documents)) if documents else 0.0
+        document_freq: Dict[str, int] = Counter()
+        for freqs in self.term_freqs:
+            document_freq.update(freqs.keys())
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_freq.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        terms = [t for t in set(query) if t in self.idf]
+        results = []
+        for freqs, length in zip(self.term_freqs, self.doc_lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
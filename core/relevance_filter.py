@@ -0,0 +1,153 @@
+import math
+import os
+import re
+import unicodedata
+from typing import List, Tuple
+
+import numpy as np
+
+from core.chunker import BULLET_PATTERN, is_heading
+from core.cleanup import split_paragraphs
+from core.relevance import tokenize
+from core.tokens import count_tokens
+
+# Tỉ lệ tối đa số đoạn được giữ lại (các đoạn liên quan nhất tới yêu cầu); 1.0 là tắt bộ lọc
+RELEVANCE_KEEP_RATIO = float(os.getenv("RELEVANCE_KEEP_RATIO", 0.6))
+# Tài liệu ngắn hơn số token này không lọc (rẻ hơn việc có thể bỏ sót nội dung)
+RELEVANCE_MIN_TOKENS = int(os.getenv("RELEVANCE_MIN_TOKENS", 3000))
+# Đoạn văn được cộng thêm điểm của heading section chứa nó theo trọng số này
+SECTION_WEIGHT = 0.5
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Đoạn văn PDF (không có dòng trống) được gom từ các dòng liền nhau, chỉ ngắt sau dấu kết câu
+# khi đã đủ số từ này, để không cắt câu giữa chừng
+RELEVANCE_BLOCK_WORDS = 60
+
+# Các cụm mô tả cách trình bày mindmap trong yêu cầu, không nói về nội dung cần giữ. So khớp
+# trên văn bản còn dấu (bỏ dấu thì "hãy" trùng "hay", "tạo" trùng "tảo"); cụm nhiều âm tiết
+# có thêm dạng không dấu vì không bị nhầm với từ nội dung.
+_INSTRUCTION_PHRASES = [
+    "sơ đồ tư duy", "mind map", "mindmap", "xmind", "tóm tắt", "tóm lược", "chi tiết", "ngắn gọn",
+    "đầy đủ", "tài liệu", "nội dung", "trình bày", "rõ ràng", "giúp tôi", "cho tôi", "hãy",
+    "so do tu duy", "tom tat", "tom luoc", "chi tiet", "ngan gon", "day du", "tai lieu", "noi dung",
+    "trinh bay", "ro rang", "giup toi",
+]
+# Động từ "tạo / lập / vẽ" chỉ là chỉ dẫn khi đứng trước sơ đồ / mindmap ("lập trình" là nội dung)
+_INSTRUCTION_VERB = r"(tạo|lập|vẽ|tao|ve)(\s+(giúp|cho)\s+tôi|\s+một|\s+1)*(?=\s+(sơ đồ|so do|mind\s?map|xmind)\b)"
+_INSTRUCTION_PATTERN = re.compile(
+    r"\b(" + _INSTRUCTION_VERB + "|" + "|".join(re.escape(p) for p in _INSTRUCTION_PHRASES) + r")\b"
+)
+_SENTENCE_END = re.compile(r"[\.\!\?;:…][\"'”)\]]*$")
+
+
+def _query_terms(user_requirements: str) -> List[str]:
+    # Tách yêu cầu tại các cụm chỉ dẫn rồi tokenize từng phần, để bigram không nối qua cụm bị bỏ
+    text = unicodedata.normalize("NFC", user_requirements).lower()
+    segments = _INSTRUCTION_PATTERN.sub("\0", text).split("\0")
+    return [term for segment in segments for term in tokenize(segment, bigrams=True)]
+
+
+def _split_blocks(text: str) -> Tuple[List[str], str]:
+    """
+    Tách văn bản thành các khối để chấm điểm. Văn bản có dòng trống thì mỗi đoạn là một khối;
+    văn bản PDF (mỗi dòng bị ngắt cứng) thì gom các dòng liền nhau: heading và bullet mở khối mới,
+    khối chỉ kết thúc ở dòng có dấu kết câu khi đã đủ RELEVANCE_BLOCK_WORDS từ.
+    """
+    paragraphs, separator = split_paragraphs(text)
+    if separator != "\n":
+        return paragraphs, separator
+
+    blocks: List[List[str]] = []
+    current: List[str] = []
+    words = 0
+    for line in paragraphs:
+        stripped = line.strip()
+        starts_block = is_heading(stripped) or bool(BULLET_PATTERN.match(stripped))
+        if current and starts_block:
+            blocks.append(current)
+            current, words = [], 0
+        current.append(line)
+        words += len(stripped.split())
+        if is_heading(stripped) or (words >= RELEVANCE_BLOCK_WORDS and _SENTENCE_END.search(stripped)):
+            blocks.append(current)
+            current, words = [], 0
+    if current:
+        blocks.append(current)
+    return ["\n".join(block) for block in blocks], "\n"
+
+
+def bm25_matrix_scores(documents: List[List[str]], query: List[str], k1: float = BM25_K1, b: float = BM25_B) -> np.ndarray:
+    """
+    BM25 của từng tài liệu với query, tính vector hoá trên ma trận tần suất chỉ gồm
+    các cột là từ của query (số cột nhỏ nên không cần ma trận thưa).
+    """
+    vocabulary = {term: i for i, term in enumerate(dict.fromkeys(query))}
+    term_freqs = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    lengths = np.empty(len(documents), dtype=np.float32)
+    for row, tokens in enumerate(documents):
+        lengths[row] = len(tokens)
+        for token in tokens:
+            column = vocabulary.get(token)
+            if column is not None:
+                term_freqs[row, column] += 1
+    if not len(documents) or not vocabulary:
+        return np.zeros(len(documents), dtype=np.float32)
+
+    doc_freq = (term_freqs > 0).sum(axis=0)
+    idf = np.log1p((len(documents) - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+    saturated = term_freqs * (k1 + 1) / (term_freqs + norm[:, None])
+    return saturated @ idf
+
+
+def filter_relevant(text: str, user_requirements: str, keep_ratio: float = RELEVANCE_KEEP_RATIO,
+                    min_tokens: int = RELEVANCE_MIN_TOKENS) -> Tuple[str, dict]:
+    """
+    Giữ lại các đoạn liên quan nhất tới yêu cầu người dùng trước khi chia chunk (với PDF,
+    đoạn là khối các dòng liền nhau, xem _split_blocks).
+    Điểm của đoạn = BM25 của đoạn + SECTION_WEIGHT x BM25 của heading section chứa nó.
+    Giữ tối đa keep_ratio số đoạn có điểm cao nhất (đoạn điểm 0 bị bỏ); heading luôn được giữ
+    để LLM vẫn thấy dàn ý của phần bị lược. Yêu cầu không có từ khoá nội dung (vd. chỉ "tóm tắt")
+    hoặc không đoạn nào khớp thì không lọc.
+    """
+    stats = {"relevance_filtered": False}
+    query = _query_terms(user_requirements)
+    if keep_ratio >= 1 or not query:
+        return text, stats
+    tokens_before = count_tokens(text)
+    if tokens_before < min_tokens:
+        return text, stats
+
+    paragraphs, separator = _split_blocks(text)
+    headings = np.array([is_heading(p.strip().split("\n", 1)[0]) for p in paragraphs], dtype=bool)
+    scores = bm25_matrix_scores([tokenize(p) for p in paragraphs], query)
+
+    # Chỉ số heading gần nhất phía trên mỗi đoạn (-1 nếu chưa có heading)
+    positions = np.arange(len(paragraphs))
+    section_of = np.maximum.accumulate(np.where(headings, positions, -1))
+    section_scores = np.where(section_of >= 0, scores[np.clip(section_of, 0, None)], 0.0)
+    combined = scores + SECTION_WEIGHT * section_scores
+    if not (combined > 0).any():
+        return text, stats
+
+    keep_count = max(1, math.ceil(keep_ratio * len(paragraphs)))
+    # Sắp xếp ổn định theo điểm giảm dần: cùng điểm thì đoạn xuất hiện trước được ưu tiên
+    ranked = np.argsort(-combined, kind="stable")[:keep_count]
+    keep = np.zeros(len(paragraphs), dtype=bool)
+    keep[ranked] = True
+    keep &= combined > 0
+    keep |= headings
+
+    filtered = separator.join(p for p, kept in zip(paragraphs, keep) if kept)
+    tokens_after = count_tokens(filtered)
+    stats.update({
+        "relevance_filtered": True,
+        "query_terms": list(dict.fromkeys(query))[:20],
+        "paragraphs_total": len(paragraphs),
+        "paragraphs_kept": int(keep.sum()),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    })
+    return filtered, stats
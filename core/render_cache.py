@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from core.cache import CACHE_DIR, make_cache_key
+from core.svg_render import render_svg
+from core.xmind_writer import build_xmind
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi renderer đổi output để không trả lại bản render cũ
+RENDER_VERSION = "1"
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(CACHE_DIR, "renders"))
+RENDER_CACHE_MEMORY_BYTES = int(os.getenv("RENDER_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_DISK_BYTES = int(os.getenv("RENDER_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+# Các thư mục output cũ trong static/ do CLI ghi ra, được dọn định kỳ
+STATIC_SWEEP_DIRS = [d for d in os.getenv("STATIC_SWEEP_DIRS", "static/output_svg,static/output_xmind").split(",") if d]
+STATIC_MAX_BYTES = int(os.getenv("STATIC_MAX_BYTES", 256 * 1024 * 1024))
+STATIC_MAX_AGE_SECONDS = int(os.getenv("STATIC_MAX_AGE_SECONDS", 24 * 3600))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", 600))
+
+RENDERERS: Dict[str, Callable[[str], bytes]] = {
+    "svg": render_svg,
+    "xmind": build_xmind,
+}
+
+
+def render_key(xmindmark_content: str, fmt: str) -> str:
+    return make_cache_key(content=xmindmark_content, format=fmt, render_version=RENDER_VERSION)
+
+
+def etag_for(key: str) -> str:
+    return f'"{key[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def sweep_dir(path: str, max_bytes: int, max_age_seconds: Optional[float] = None) -> int:
+    """
+    Xoá file quá hạn (theo mtime) rồi xoá file cũ nhất tới khi tổng dung lượng <= max_bytes.
+    Trả về số byte còn lại trong thư mục.
+    """
+    now = time.time()
+    files = []
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            file_path = os.path.join(dirpath, name)
+            if name.endswith(".tmp"):
+                # File đang được ghi dở
+                continue
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            if max_age_seconds is not None and now - stat.st_mtime > max_age_seconds:
+                _remove(file_path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, file_path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, file_path in sorted(files):
+        if total <= max_bytes:
+            break
+        _remove(file_path)
+        total -= size
+    return total
+
+
+def _remove(file_path: str):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+class RenderCache:
+    """
+    Cache bản render theo hash của XMindMark đã chuẩn hoá và định dạng output.
+    Tầng bộ nhớ là LRU giới hạn theo byte; tầng đĩa lưu mỗi bản render một file,
+    mtime được cập nhật khi đọc để vượt dung lượng thì xoá file ít dùng nhất.
+    """
+
+    def __init__(self, directory: str, memory_bytes: int = RENDER_CACHE_MEMORY_BYTES, disk_bytes: int = RENDER_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk_size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _file_path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def _remember(self, key: str, data: bytes):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if len(data) > self.memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _read_disk(self, key: str, fmt: str) -> Optional[bytes]:
+        file_path = self._file_path(key, fmt)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            os.utime(file_path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, fmt: str, data: bytes):
+        file_path = self._file_path(key, fmt)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sweep_dir(self.directory, self.disk_bytes)
+                return
+            self._disk_size += len(data)
+            if self._disk_size > self.disk_bytes:
+                self._disk_size = sweep_dir(self.directory, self.disk_bytes)
+
+    def get(self, xmindmark_content: str, fmt: str) -> Optional[bytes]:
+        """Lấy bản render đã cache (bộ nhớ rồi tới đĩa), không render"""
+        key = render_key(xmindmark_content, fmt)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        data = self._read_disk(key, fmt)
+        if data is not None:
+            with self._lock:
+                self._remember(key, data)
+        return data
+
+    def put(self, xmindmark_content: str, fmt: str, data: bytes):
+        key = render_key(xmindmark_content, fmt)
+        try:
+            self._write_disk(key, fmt, data)
+        except OSError as e:
+            logger.warning(f"Không ghi được render cache: {e}")
+        with self._lock:
+            self._remember(key, data)
+
+    def get_or_render(self, xmindmark_content: str, fmt: str) -> Tuple[bytes, str]:
+        """Trả về (bytes, etag); chỉ render khi cả hai tầng cache đều không có"""
+        data = self.get(xmindmark_content, fmt)
+        if data is None:
+            data = RENDERERS[fmt](xmindmark_content)
+            self.put(xmindmark_content, fmt, data)
+        return data, etag_for(render_key(xmindmark_content, fmt))
+
+    def sweep(self):
+        with self._lock:
+            self._disk_size = sweep_dir(self.directory, self.disk_bytes)
+
+
+render_cache = RenderCache(RENDER_CACHE_DIR)
+
+
+def sweep_static_outputs():
+    render_cache.sweep()
+    for directory in STATIC_SWEEP_DIRS:
+        if os.path.isdir(directory):
+            sweep_dir(directory, STATIC_MAX_BYTES, STATIC_MAX_AGE_SECONDS)
+
+
+async def run_sweeper(interval: float = SWEEP_INTERVAL_SECONDS, extra_sweeps: Iterable[Callable[[], None]] = ()):
+    """Chạy nền suốt vòng đời app: định kỳ dọn render cache, các thư mục output trong static/ và extra_sweeps"""
+    while True:
+        for sweep in (sweep_static_outputs, *extra_sweeps):
+            try:
+                await asyncio.to_thread(sweep)
+            except Exception as e:
+                logger.warning(f"Dọn file tạm thất bại ({sweep.__name__}): {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import zipfile
+from typing import AsyncIterator, List, Optional, Tuple
+
+from core.process_pool import get_process_pool
+from core.render_cache import RENDERERS, etag_for, render_cache, render_key
+
+RENDER_BATCH_MAX_ITEMS = int(os.getenv("RENDER_BATCH_MAX_ITEMS", 1000))
+
+
+def _render_in_worker(xmindmark_content: str, fmt: str) -> bytes:
+    return RENDERERS[fmt](xmindmark_content)
+
+
+async def _render_item(index: int, xmindmark_content: str, fmt: str) -> Tuple[int, Optional[bytes], Optional[str], str]:
+    """Render một item; trả về (index, bytes, lỗi, etag), lỗi được giữ lại thay vì làm hỏng cả batch"""
+    etag = etag_for(render_key(xmindmark_content, fmt))
+    try:
+        data = await asyncio.to_thread(render_cache.get, xmindmark_content, fmt)
+        if data is None:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(get_process_pool(), _render_in_worker, xmindmark_content, fmt)
+            await asyncio.to_thread(render_cache.put, xmindmark_content, fmt, data)
+        return index, data, None, etag
+    except Exception as e:
+        return index, None, f"{type(e).__name__}: {e}", etag
+
+
+async def render_batch(items: List[Tuple[str, str]]) -> AsyncIterator[Tuple[int, Optional[bytes], Optional[str], str]]:
+    """
+    Render nhiều (nội dung, định dạng) song song trên process pool (số worker = số CPU),
+    trả về kết quả theo thứ tự hoàn thành.
+    """
+    tasks = [asyncio.ensure_future(_render_item(i, content, fmt)) for i, (content, fmt) in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class _ZipStream:
+    """File-like chỉ ghi, để zipfile ghi từng phần rồi lấy ra stream ngay (không cần seek)"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+async def stream_zip(results: AsyncIterator[Tuple[str, Optional[bytes], Optional[str]]]) -> AsyncIterator[bytes]:
+    """
+    Ghi (tên file, bytes, lỗi) thành file zip theo kiểu stream: mỗi file được gửi đi ngay khi xong.
+    Các item lỗi được liệt kê trong errors.json ở cuối zip.
+    """
+    stream = _ZipStream()
+    errors = {}
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+        async for name, data, error in results:
+            if error is not None:
+                errors[name] = error
+                continue
+            archive.writestr(name, data)
+            yield stream.pop()
+        if errors:
+            archive.writestr("errors.json", json.dumps(errors, ensure_ascii=False, indent=2))
+    yield stream.pop()
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from core.cache import CACHE_DIR
+from core.relevance import tokenize
+from core.search_context import PAGE_SEPARATOR, split_passages
+from core.tavily_search import atavily_search
+
+logger = logging.getLogger(__name__)
+
+LOCAL_DOCS_DIR = os.getenv("LOCAL_DOCS_DIR", os.path.join(os.getcwd(), "docs"))
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", os.path.join(CACHE_DIR, "local_index.sqlite3"))
+LOCAL_SEARCH_TOP_K = int(os.getenv("LOCAL_SEARCH_TOP_K", 8))
+
+SEARCH_BACKENDS = ("tavily", "local", "both")
+_INDEXED_EXTENSIONS = (".md", ".txt", ".pdf", ".docx")
+
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+
+
+class Retriever(ABC):
+    """Nguồn thông tin bổ sung cho các chế độ enable_search"""
+
+    name = "base"
+
+    @abstractmethod
+    async def search(self, query: str) -> Optional[str]:
+        """Trả về context (các trang phân cách bằng PAGE_SEPARATOR) hoặc None nếu không có"""
+
+
+class TavilyRetriever(Retriever):
+    name = "tavily"
+
+    async def search(self, query: str) -> Optional[str]:
+        return await atavily_search(query)
+
+
+class LocalIndexRetriever(Retriever):
+    """
+    Tìm kiếm BM25 trên inverted index lưu trong SQLite, xây từ thư mục tài liệu nội bộ
+    (build_local_index). Mỗi đoạn (passage) của tài liệu là một đơn vị được xếp hạng.
+    """
+
+    name = "local"
+
+    def __init__(self, index_path: str = LOCAL_INDEX_PATH, top_k: int = LOCAL_SEARCH_TOP_K):
+        self.index_path = index_path
+        self.top_k = top_k
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and os.path.exists(self.index_path):
+            self._conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True, check_same_thread=False)
+        return self._conn
+
+    def query(self, query: str) -> List[tuple]:
+        """Trả về [(score, đường dẫn tài liệu, nội dung đoạn)] theo điểm giảm dần"""
+        terms = set(tokenize(query))
+        with self._lock:
+            db = self._db()
+            if db is None or not terms:
+                return []
+            total, avg_length = db.execute("SELECT COUNT(*), COALESCE(AVG(length), 0) FROM passages").fetchone()
+            scores: Dict[int, float] = defaultdict(float)
+            for term in terms:
+                postings = db.execute(
+                    "SELECT p.passage_id, p.tf, s.length FROM postings p JOIN passages s ON s.id = p.passage_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for passage_id, tf, length in postings:
+                    norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * length / (avg_length or 1))
+                    scores[passage_id] += idf * tf * (_BM25_K1 + 1) / (tf + norm)
+
+            top = sorted(scores.items(), key=lambda item: -item[1])[:self.top_k]
+            results = []
+            for passage_id, score in top:
+                path, text = db.execute(
+                    "SELECT d.path, s.text FROM passages s JOIN documents d ON d.id = s.doc_id WHERE s.id = ?",
+                    (passage_id,),
+                ).fetchone()
+                results.append((score, path, text))
+            return results
+
+    async def search(self, query: str) -> Optional[str]:
+        # Truy vấn SQLite chạy trong thread, không chặn event loop
+        results = await asyncio.to_thread(self.query, query)
+        if not results:
+            return None
+        # Gom các đoạn cùng tài liệu thành một "trang"
+        pages: Dict[str, List[str]] = {}
+        for _, path, text in results:
+            pages.setdefault(path, []).append(text)
+        return PAGE_SEPARATOR.join(f"[{os.path.basename(path)}]\n" + "\n\n".join(texts) for path, texts in pages.items())
+
+
+def _read_document(path: str) -> str:
+    if path.endswith((".md", ".txt")):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    from core.text_processing import extract_text_from_file
+    with open(path, "rb") as f:
+        return extract_text_from_file(f)
+
+
+def build_local_index(docs_dir: str = LOCAL_DOCS_DIR, index_path: str = LOCAL_INDEX_PATH) -> dict:
+    """
+    Xây / cập nhật inverted index cho thư mục tài liệu. Tài liệu không đổi (mtime)
+    được giữ nguyên, tài liệu bị xoá được gỡ khỏi index.
+    """
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    db = sqlite3.connect(index_path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL);
+        CREATE TABLE IF NOT EXISTS passages (id INTEGER PRIMARY KEY, doc_id INTEGER, text TEXT, length INTEGER);
+        CREATE TABLE IF NOT EXISTS postings (term TEXT, passage_id INTEGER, tf INTEGER);
+        CREATE INDEX IF NOT EXISTS idx_postings_term ON postings(term);
+        CREATE INDEX IF NOT EXISTS idx_passages_doc ON passages(doc_id);
+    """)
+
+    def remove_document(doc_id: int):
+        db.execute("DELETE FROM postings WHERE passage_id IN (SELECT id FROM passages WHERE doc_id = ?)", (doc_id,))
+        db.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+        db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    known = {path: (doc_id, mtime) for doc_id, path, mtime in db.execute("SELECT id, path, mtime FROM documents")}
+    seen = set()
+    stats = Counter()
+
+    for dirpath, _, filenames in os.walk(docs_dir):
+        for filename in filenames:
+            if not filename.lower().endswith(_INDEXED_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            seen.add(path)
+            mtime = os.path.getmtime(path)
+            if path in known:
+                if known[path][1] == mtime:
+                    stats["unchanged"] += 1
+                    continue
+                remove_document(known[path][0])
+            try:
+                text = _read_document(path)
+            except Exception as e:
+                logger.warning(f"Bỏ qua {path}: {e}")
+                stats["failed"] += 1
+                continue
+
+            doc_id = db.execute("INSERT INTO documents (path, mtime) VALUES (?, ?)", (path, mtime)).lastrowid
+            for passage in split_passages(text):
+                tokens = tokenize(passage)
+                passage_id = db.execute(
+                    "INSERT INTO passages (doc_id, text, length) VALUES (?, ?, ?)", (doc_id, passage, len(tokens))
+                ).lastrowid
+                db.executemany(
+                    "INSERT INTO postings (term, passage_id, tf) VALUES (?, ?, ?)",
+                    [(term, passage_id, tf) for term, tf in Counter(tokens).items()],
+                )
+            stats["indexed"] += 1
+
+    for path, (doc_id, _) in known.items():
+        if path not in seen:
+            remove_document(doc_id)
+            stats["removed"] += 1
+
+    db.commit()
+    db.close()
+    return dict(stats)
+
+
+_retrievers: Dict[str, Retriever] = {
+    "tavily": TavilyRetriever(),
+    "local": LocalIndexRetriever(),
+}
+
+
+async def aretrieve_context(query: str, backend: str = "tavily") -> Optional[str]:
+    """Lấy context từ một backend ("tavily", "local") hoặc cả hai ("both") chạy song song"""
+    names = ["tavily", "local"] if backend == "both" else [backend]
+    results = await asyncio.gather(*(_retrievers[name].search(query) for name in names))
+    contexts = [context for context in results if context]
+    return PAGE_SEPARATOR.join(contexts) if contexts else None
+
+
+if __name__ == "__main__":
+    # python -m core.retrieval [thư mục tài liệu]
+    print(build_local_index(sys.argv[1] if len(sys.argv) > 1 else LOCAL_DOCS_DIR))
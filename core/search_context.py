@@ -0,0 +1,133 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Optional
+
+from core.relevance import BM25, fold_diacritics, tokenize
+from core.tokens import count_tokens
+
+SEARCH_CONTEXT_TOKEN_BUDGET = int(os.getenv("SEARCH_CONTEXT_TOKEN_BUDGET", 3000))
+# Ngưỡng Jaccard ước lượng (MinHash) để coi hai đoạn là trùng nhau
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+# Dấu phân cách giữa các trang trong chuỗi context trả về từ tavily_search
+PAGE_SEPARATOR = "\n\n---\n\n"
+
+_MIN_PASSAGE_WORDS = 12
+_MAX_PASSAGE_WORDS = 220
+_SENTENCE_END = re.compile(r"(?<=[\.\!\?…])\s+")
+_WORD = re.compile(r"\w+")
+
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_MERSENNE = (1 << 61) - 1
+_PERMUTATIONS = [((i * 0x9E3779B1 + 1) % _MERSENNE | 1, (i * 0x85EBCA77 + 7) % _MERSENNE) for i in range(1, _NUM_PERM + 1)]
+
+
+def split_passages(page: str) -> List[str]:
+    """
+    Chia trang thành các đoạn vừa phải: gộp các dòng ngắn liền nhau, cắt đoạn quá dài
+    theo câu, bỏ các đoạn quá ngắn (menu, link, footer...).
+    """
+    passages: List[str] = []
+    buffer: List[str] = []
+    buffer_words = 0
+
+    def flush():
+        nonlocal buffer_words
+        if buffer and buffer_words >= _MIN_PASSAGE_WORDS:
+            passages.append(" ".join(buffer))
+        buffer.clear()
+        buffer_words = 0
+
+    for block in re.split(r"\n\s*\n", page):
+        block = " ".join(block.split())
+        if not block:
+            continue
+        for sentence in _SENTENCE_END.split(block) if len(block.split()) > _MAX_PASSAGE_WORDS else [block]:
+            words = len(sentence.split())
+            if buffer_words + words > _MAX_PASSAGE_WORDS:
+                flush()
+            buffer.append(sentence)
+            buffer_words += words
+        if buffer_words >= _MIN_PASSAGE_WORDS * 4:
+            flush()
+    flush()
+    return passages
+
+
+def _minhash(text: str) -> Optional[tuple]:
+    words = _WORD.findall(fold_diacritics(text))
+    size = 3 if len(words) < 40 else 5
+    shingles = {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(max(1, len(words) - size + 1))}
+    if not shingles:
+        return None
+    return tuple(min((a * h + b) % _MERSENNE for h in shingles) for a, b in _PERMUTATIONS)
+
+
+def remove_near_duplicates(passages: List[str], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[int]:
+    """Trả về chỉ số các đoạn được giữ lại (đoạn xuất hiện trước được ưu tiên) dùng MinHash + LSH"""
+    buckets = defaultdict(list)
+    signatures = {}
+    kept: List[int] = []
+
+    for index, passage in enumerate(passages):
+        signature = _minhash(passage)
+        if signature is None:
+            continue
+        bands = [signature[i:i + _ROWS] for i in range(0, _NUM_PERM, _ROWS)]
+        candidates = {other for band_no, band in enumerate(bands) for other in buckets[(band_no, band)]}
+        if any(sum(x == y for x, y in zip(signature, signatures[other])) / _NUM_PERM >= threshold
+               for other in candidates):
+            continue
+        signatures[index] = signature
+        for band_no, band in enumerate(bands):
+            buckets[(band_no, band)].append(index)
+        kept.append(index)
+    return kept
+
+
+def condense_search_context(
+    context: str,
+    user_requirements: str,
+    token_budget: int = SEARCH_CONTEXT_TOKEN_BUDGET,
+) -> Optional[str]:
+    """
+    Rút gọn nội dung tìm kiếm trước khi đưa vào prompt: chia đoạn, bỏ đoạn trùng giữa
+    các trang, xếp hạng BM25 theo yêu cầu người dùng, giữ các đoạn điểm cao nhất vừa
+    token_budget (giữ nguyên thứ tự xuất hiện). Trả về None nếu không còn đoạn nào.
+    """
+    if count_tokens(context) <= token_budget:
+        return context
+
+    pages = [page for page in context.split(PAGE_SEPARATOR) if page.strip()]
+    passages = []
+    page_of = []
+    for page_index, page in enumerate(pages):
+        for passage in split_passages(page):
+            passages.append(passage)
+            page_of.append(page_index)
+
+    kept = remove_near_duplicates(passages)
+    if not kept:
+        return None
+
+    scores = BM25([tokenize(passages[i]) for i in kept]).scores(tokenize(user_requirements))
+    selected = []
+    used = 0
+    for score, index in sorted(zip(scores, kept), key=lambda item: (-item[0], item[1])):
+        tokens = count_tokens(passages[index])
+        if used + tokens > token_budget:
+            continue
+        selected.append(index)
+        used += tokens
+
+    sections = []
+    for index in sorted(selected):
+        if sections and page_of[index] == sections[-1][0]:
+            sections[-1][1].append(passages[index])
+        else:
+            sections.append((page_of[index], [passages[index]]))
+    return PAGE_SEPARATOR.join("\n\n".join(parts) for _, parts in sections) or None
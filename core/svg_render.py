@@ -0,0 +1,243 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+from core.xmindmark import XMindNode, parse_xmindmark
+
+FONT_FAMILY = "Arial, Helvetica, sans-serif"
+# Nhãn dài hơn độ rộng này (px) sẽ được xuống dòng
+MAX_LABEL_WIDTH = 240
+H_GAP = 40
+V_GAP = 12
+MARGIN = 24
+BOLD_FACTOR = 1.06
+
+# (cỡ chữ, in đậm, padding ngang, padding dọc) theo cấp: gốc, nhánh chính, các cấp sau
+LEVEL_STYLES = [(22, True, 18, 12), (16, True, 12, 8), (14, False, 8, 5)]
+ROOT_FILL = "#1B3A57"
+BRANCH_COLORS = ["#2E86DE", "#10AC84", "#EE5253", "#FF9F43", "#8854D0", "#0ABDE3", "#F368E0", "#576574"]
+TEXT_COLOR = "#222222"
+
+# Độ rộng ký tự Arial/Helvetica (đơn vị 1/1000 em) cho ASCII 32..126
+_ASCII_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_DEFAULT_WIDTH = 556
+# Ký tự không hợp lệ trong XML 1.0 (ký tự điều khiển, surrogate, U+FFFE/U+FFFF)
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def _xml_text(text: str) -> str:
+    return escape(_XML_INVALID.sub("", text))
+
+
+@lru_cache(maxsize=4096)
+def char_width(char: str) -> int:
+    """Độ rộng một ký tự (1/1000 em); chữ có dấu lấy theo chữ gốc, chữ CJK rộng 1 em"""
+    code = ord(char)
+    if 32 <= code <= 126:
+        return _ASCII_WIDTHS[code - 32]
+    if unicodedata.east_asian_width(char) in ("W", "F"):
+        return 1000
+    if unicodedata.combining(char):
+        return 0
+    base = unicodedata.normalize("NFD", char)[0]
+    if base != char:
+        return char_width(base)
+    if char in "đĐ":
+        return 556 if char == "đ" else 722
+    return _DEFAULT_WIDTH
+
+
+@lru_cache(maxsize=16384)
+def text_width(text: str, font_size: float, bold: bool = False) -> float:
+    width = sum(char_width(c) for c in text) * font_size / 1000
+    return width * BOLD_FACTOR if bold else width
+
+
+def wrap_label(label: str, font_size: float, bold: bool, max_width: float = MAX_LABEL_WIDTH) -> List[str]:
+    """Xuống dòng theo từ sao cho mỗi dòng không vượt max_width (từ quá dài giữ nguyên)"""
+    lines: List[str] = []
+    current = ""
+    for word in label.split():
+        candidate = f"{current} {word}" if current else word
+        if current and text_width(candidate, font_size, bold) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    lines.append(current)
+    return lines
+
+
+@dataclass
+class LaidOutNode:
+    label_lines: List[str]
+    depth: int
+    parent: int
+    side: int
+    color: str
+    font_size: float
+    bold: bool
+    width: float
+    height: float
+    extent: float = 0.0
+    x: float = 0.0
+    y: float = 0.0
+
+
+def _style(depth: int) -> Tuple[float, bool, float, float]:
+    return LEVEL_STYLES[min(depth, len(LEVEL_STYLES) - 1)]
+
+
+def layout_tree(root: XMindNode) -> List[LaidOutNode]:
+    """
+    Bố cục cây kiểu mind map: gốc ở giữa, các nhánh chính chia hai bên theo chiều cao.
+    Một lượt duyệt ngược (tính chiều cao khối của từng nhánh) và một lượt duyệt xuôi
+    (đặt toạ độ) nên chạy O(n), không đệ quy nên không giới hạn độ sâu.
+    """
+    nodes: List[LaidOutNode] = []
+    children: List[List[int]] = []
+    queue: List[Tuple[XMindNode, int, int]] = [(root, -1, 0)]
+    head = 0
+    while head < len(queue):
+        node, parent, depth = queue[head]
+        head += 1
+        font_size, bold, pad_x, pad_y = _style(depth)
+        lines = wrap_label(node.label, font_size, bold)
+        line_height = font_size * 1.25
+        index = len(nodes)
+        if parent <= 0:
+            color = ROOT_FILL if parent < 0 else BRANCH_COLORS[(len(children[0])) % len(BRANCH_COLORS)]
+        else:
+            color = nodes[parent].color
+        nodes.append(LaidOutNode(
+            label_lines=lines,
+            depth=depth,
+            parent=parent,
+            side=1,
+            color=color,
+            font_size=font_size,
+            bold=bold,
+            width=max(text_width(line, font_size, bold) for line in lines) + 2 * pad_x,
+            height=len(lines) * line_height + 2 * pad_y,
+        ))
+        children.append([])
+        if parent >= 0:
+            children[parent].append(index)
+        for child in node.children:
+            queue.append((child, index, depth + 1))
+
+    # Chiều cao khối của mỗi nhánh (duyệt ngược thứ tự BFS = con trước cha)
+    for index in range(len(nodes) - 1, -1, -1):
+        kids = children[index] if index else []
+        stacked = sum(nodes[k].extent for k in kids) + V_GAP * max(len(kids) - 1, 0)
+        nodes[index].extent = max(nodes[index].height, stacked)
+
+    # Chia nhánh chính: nửa đầu (theo chiều cao) bên phải, phần còn lại bên trái
+    main_branches = children[0]
+    total = sum(nodes[k].extent for k in main_branches)
+    right, left, acc = [], [], 0.0
+    for k in main_branches:
+        if acc < total / 2 or not right:
+            right.append(k)
+            acc += nodes[k].extent
+        else:
+            left.append(k)
+
+    def place_block(kids: List[int], center_y: float):
+        block = sum(nodes[k].extent for k in kids) + V_GAP * max(len(kids) - 1, 0)
+        top = center_y - block / 2
+        for k in kids:
+            nodes[k].y = top + nodes[k].extent / 2
+            top += nodes[k].extent + V_GAP
+
+    root_node = nodes[0]
+    root_node.x, root_node.y = -root_node.width / 2, 0.0
+    for side, kids in ((1, right), (-1, left)):
+        place_block(kids, 0.0)
+        for k in kids:
+            nodes[k].side = side
+            nodes[k].x = root_node.width / 2 + H_GAP if side > 0 else -root_node.width / 2 - H_GAP - nodes[k].width
+
+    for index in range(1, len(nodes)):
+        node = nodes[index]
+        kids = children[index]
+        if not kids:
+            continue
+        place_block(kids, node.y)
+        for k in kids:
+            child = nodes[k]
+            child.side = node.side
+            child.x = node.x + node.width + H_GAP if node.side > 0 else node.x - H_GAP - child.width
+    return nodes
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _edge_path(parent: LaidOutNode, child: LaidOutNode, dx: float, dy: float) -> str:
+    if child.side > 0:
+        x1, x2 = parent.x + parent.width, child.x
+    else:
+        x1, x2 = parent.x, child.x + child.width
+    if parent.parent < 0:
+        x1 = parent.x + parent.width / 2
+    y1, y2 = parent.y, child.y
+    mid = (x1 + x2) / 2
+    return (f"M{_fmt(x1 + dx)},{_fmt(y1 + dy)} C{_fmt(mid + dx)},{_fmt(y1 + dy)} "
+            f"{_fmt(mid + dx)},{_fmt(y2 + dy)} {_fmt(x2 + dx)},{_fmt(y2 + dy)}")
+
+
+def render_svg(xmindmark_content: str) -> bytes:
+    """Render XMindMark thành SVG ngay trong process, ghi thẳng vào buffer bytes"""
+    nodes = layout_tree(parse_xmindmark(xmindmark_content))
+    min_x = min(n.x for n in nodes)
+    max_x = max(n.x + n.width for n in nodes)
+    min_y = min(n.y - n.height / 2 for n in nodes)
+    max_y = max(n.y + n.height / 2 for n in nodes)
+    dx, dy = MARGIN - min_x, MARGIN - min_y
+    width, height = max_x - min_x + 2 * MARGIN, max_y - min_y + 2 * MARGIN
+
+    buffer = BytesIO()
+    write = lambda s: buffer.write(s.encode("utf-8"))
+    write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{_fmt(width)}" height="{_fmt(height)}" '
+          f'viewBox="0 0 {_fmt(width)} {_fmt(height)}" font-family="{FONT_FAMILY}">\n')
+    write(f'<rect width="100%" height="100%" fill="#FFFFFF"/>\n<g fill="none" stroke-width="2">\n')
+    for node in nodes[1:]:
+        write(f'<path d="{_edge_path(nodes[node.parent], node, dx, dy)}" stroke="{node.color}"/>\n')
+    write("</g>\n")
+
+    for node in nodes:
+        left, top = node.x + dx, node.y + dy - node.height / 2
+        if node.depth <= 1:
+            write(f'<rect x="{_fmt(left)}" y="{_fmt(top)}" width="{_fmt(node.width)}" height="{_fmt(node.height)}" '
+                  f'rx="6" fill="{node.color}"/>\n')
+            text_color = "#FFFFFF"
+        else:
+            write(f'<rect x="{_fmt(left)}" y="{_fmt(top)}" width="{_fmt(node.width)}" height="{_fmt(node.height)}" '
+                  f'rx="4" fill="#FFFFFF" stroke="{node.color}"/>\n')
+            text_color = TEXT_COLOR
+        line_height = node.font_size * 1.25
+        first_baseline = node.y + dy - (len(node.label_lines) - 1) * line_height / 2 + node.font_size * 0.35
+        weight = ' font-weight="bold"' if node.bold else ""
+        write(f'<text x="{_fmt(left + node.width / 2)}" y="{_fmt(first_baseline)}" font-size="{_fmt(node.font_size)}"'
+              f'{weight} fill="{text_color}" text-anchor="middle">')
+        for i, line in enumerate(node.label_lines):
+            if i == 0:
+                write(_xml_text(line))
+            else:
+                write(f'<tspan x="{_fmt(left + node.width / 2)}" dy="{_fmt(line_height)}">{_xml_text(line)}</tspan>')
+        write("</text>\n")
+    write("</svg>\n")
+    return buffer.getvalue()
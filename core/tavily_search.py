@@ -1,9 +1,19 @@
+import asyncio
+import logging
 import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
 from tavily import TavilyClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 client = TavilyClient(api_key=os.getenv('TAVILY_API_KEY'))
 
 
@@ -22,3 +32,93 @@ def tavily_search(query: str):
     except Exception as e:
         return f"Lỗi tìm kiếm: {str(e)}"
 
+
+
+# ---------------------------------------------------------------------------
+# Async: gọi thẳng REST API của Tavily qua httpx, có cache TTL theo query,
+# gộp các query giống nhau đang chạy (single-flight) và deadline. TAVILY_BASE_URL
+# có thể trỏ sang server giả lập khi test.
+# ---------------------------------------------------------------------------
+
+TAVILY_BASE_URL = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com")
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", 8))
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 3600))
+SEARCH_CACHE_ITEMS = int(os.getenv("SEARCH_CACHE_ITEMS", 512))
+
+_search_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_inflight: "dict[str, asyncio.Future]" = {}
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", query).lower().split())
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        # Timeout của HTTP dài hơn deadline của request: lần gọi chậm vẫn kịp điền cache
+        _http_client = httpx.AsyncClient(base_url=TAVILY_BASE_URL, timeout=30)
+    return _http_client
+
+
+async def _fetch_tavily(query: str) -> Optional[str]:
+    response = await _get_http_client().post(
+        "/search",
+        json={
+            "query": query,
+            "topic": "general",
+            "max_results": 3,
+            "include_raw_content": "text",
+        },
+        headers={"Authorization": f"Bearer {os.getenv('TAVILY_API_KEY', '')}"},
+    )
+    response.raise_for_status()
+    content_list = [r["raw_content"] for r in response.json().get("results", []) if r.get("raw_content")]
+    return "\n\n---\n\n".join(content_list) if content_list else None
+
+
+async def _fetch_and_cache(key: str, query: str) -> Optional[str]:
+    content = await _fetch_tavily(query)
+    if content is not None:
+        _search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL_SECONDS, content)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_ITEMS:
+            _search_cache.popitem(last=False)
+    return content
+
+
+def _forget_inflight(key: str, future: asyncio.Future):
+    _inflight.pop(key, None)
+    # Đánh dấu exception đã được đọc, tránh cảnh báo khi mọi request chờ đều đã hết deadline
+    if not future.cancelled():
+        future.exception()
+
+
+async def atavily_search(query: str, timeout: float = SEARCH_TIMEOUT_SECONDS) -> Optional[str]:
+    """
+    Tìm kiếm không chặn event loop. Trả về None khi không có kết quả, lỗi hoặc quá
+    deadline, để phía gọi tạo mindmap không cần thông tin tìm kiếm.
+    """
+    key = normalize_query(query)
+    entry = _search_cache.get(key)
+    if entry is not None:
+        if entry[0] > time.monotonic():
+            _search_cache.move_to_end(key)
+            return entry[1]
+        del _search_cache[key]
+
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_fetch_and_cache(key, query))
+        _inflight[key] = future
+        future.add_done_callback(lambda f: _forget_inflight(key, f))
+
+    try:
+        # shield: một request hết deadline không huỷ lần gọi mà request khác đang chờ
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Tavily search quá {timeout}s, bỏ qua tìm kiếm: {query!r}")
+    except Exception as e:
+        logger.warning(f"Tavily search lỗi, bỏ qua tìm kiếm: {e}")
+    return None
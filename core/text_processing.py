@@ -1,10 +1,86 @@
+import hashlib
+import os
+from io import BytesIO
+from typing import Iterator, List, Union
+
 import PyPDF2
 from docx import Document
 
+from core.cache import CACHE_DIR, ResultCache, make_cache_key
+from core.process_pool import get_process_pool
+
+# Tăng khi đổi cách trích xuất để không dùng lại kết quả cũ trong cache
+EXTRACTOR_VERSION = "2"
+# Ngăn cách các trang PDF, để bước làm sạch nhận ra header/footer lặp lại giữa các trang
+PAGE_BREAK = "\f"
+# PDF ít trang hơn ngưỡng này đọc luôn trong process hiện tại (chi phí gửi sang worker lớn hơn lợi ích)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+# Văn bản đã trích xuất, key theo SHA-256 của file upload
+extraction_cache = ResultCache(os.path.join(CACHE_DIR, "extractions.sqlite3"))
+
+
+def _open_pdf(source: Union[bytes, str]) -> PyPDF2.PdfReader:
+    # source là nội dung file hoặc đường dẫn (worker tự mở file, không phải gửi cả file qua pickle)
+    return PyPDF2.PdfReader(BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def pdf_page_count(source: Union[bytes, str]) -> int:
+    return len(_open_pdf(source).pages)
+
+
+def _extract_pdf_pages(source: Union[bytes, str], start: int, end: int) -> List[str]:
+    """Chạy trong worker: trích xuất text của các trang [start, end)"""
+    reader = _open_pdf(source)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_pdf_pages(source: Union[bytes, str]) -> Iterator[str]:
+    """
+    Sinh text từng trang PDF theo đúng thứ tự. PDF lớn được chia thành các khoảng trang
+    và trích xuất song song trên process pool.
+    """
+    page_count = pdf_page_count(source)
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        yield from _extract_pdf_pages(source, 0, page_count)
+        return
+
+    pool = get_process_pool()
+    futures = [
+        pool.submit(_extract_pdf_pages, source, start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _extract_text(data: bytes, file_extension: str) -> str:
+    if file_extension == 'pdf':
+        return PAGE_BREAK.join(iter_pdf_pages(data)).strip()
+
+    elif file_extension == 'docx':
+        doc = Document(BytesIO(data))
+        text = "\n".join([p.text for p in doc.paragraphs])
+        return text.strip()
+
+    elif file_extension == 'md':
+        text = data.decode('utf-8')
+        return text.strip()
+
+    else:
+        raise Exception(f"Định dạng file '{file_extension}' không được hỗ trợ.")
+
+
 def extract_text_from_file(uploaded_file) -> str:
     """
     Trích xuất văn bản từ file PDF, DOCX, hoặc MD.
     Hỗ trợ cả Streamlit (BytesIO) và FastAPI (UploadFile).
+    Kết quả được cache theo SHA-256 nội dung file nên upload lại cùng file không phải trích xuất lại.
     """
     try:
         # Lấy tên file từ Streamlit hoặc FastAPI
@@ -21,25 +97,21 @@ def extract_text_from_file(uploaded_file) -> str:
             file_stream = uploaded_file
 
         file_stream.seek(0)
+        data = file_stream.read()
 
-        if file_extension == 'pdf':
-            pdf_reader = PyPDF2.PdfReader(file_stream)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+        cache_key = make_cache_key(
+            sha256=hashlib.sha256(data).hexdigest(),
+            extension=file_extension,
+            extractor_version=EXTRACTOR_VERSION,
+        )
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        elif file_extension == 'docx':
-            doc = Document(file_stream)
-            text = "\n".join([p.text for p in doc.paragraphs])
-            return text.strip()
-
-        elif file_extension == 'md':
-            text = file_stream.read().decode('utf-8')
-            return text.strip()
-
-        else:
-            raise Exception(f"Định dạng file '{file_extension}' không được hỗ trợ.")
+        text = _extract_text(data, file_extension)
+        extraction_cache.set(cache_key, text)
+        return text
 
     except Exception as e:
         raise Exception(f"Lỗi khi đọc file: {str(e)}")
+
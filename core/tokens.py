@@ -0,0 +1,62 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+try:
+    import tiktoken
+    # o200k_base tách âm tiết tiếng Việt có dấu tốt hơn nhiều so với cl100k_base
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+# Ước lượng khi không có tiktoken: âm tiết ASCII ~ 1.3 token, âm tiết có dấu ~ 2 token,
+# mỗi dấu câu 1 token
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_CACHE_SIZE = 4096
+_cache: "OrderedDict[bytes, int]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _estimate_tokens(text: str) -> int:
+    total = 0.0
+    for piece in _WORD_PATTERN.findall(text):
+        if not (piece[0].isalnum() or piece[0] == "_"):
+            total += 1
+        elif piece.isascii():
+            total += 1.3
+        else:
+            total += 2.0
+    return int(total)
+
+
+def _count_tokens_uncached(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Đếm số token của văn bản. Văn bản được chuẩn hoá NFC trước (PDF hay trả về
+    tiếng Việt dạng tổ hợp, làm số token bị đếm dư), kết quả được cache theo hash.
+    """
+    if not text:
+        return 0
+    text = unicodedata.normalize("NFC", text)
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    tokens = _count_tokens_uncached(text)
+
+    with _cache_lock:
+        _cache[key] = tokens
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return tokens
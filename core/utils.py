@@ -2,13 +2,15 @@ import os
 import subprocess
 import tempfile
 import shutil
+import uuid
 from datetime import datetime
 from typing import Optional
 
 def generate_base_filename() -> str:
+    """Tên file theo thời gian kèm hậu tố ngẫu nhiên để các request đồng thời không trùng tên"""
     now = datetime.now()
-    timestamp = now.strftime("%Y%m%d_%H%M%S")
-    return timestamp
+    timestamp = now.strftime("%Y%m%d_%H%M%S_%f")
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}"
 
 
 def xmindmark_to_svg(xmindmark_content: str) -> str:
@@ -50,36 +52,32 @@ def xmindmark_to_svg(xmindmark_content: str) -> str:
 
 def xmindmark_to_xmind_file(xmindmark_content: str) -> Optional[str]:
     """
-    Chuyển đổi XMindMark thành file .xmind và trả về đường dẫn tương đối của file.
+    Chuyển đổi XMindMark thành file .xmind bằng CLI và trả về đường dẫn của file.
+    CLI chạy trong thư mục tạm riêng của request (tự xoá sau khi xong), kết quả được copy
+    ra static/output_xmind với tên riêng nên các request đồng thời không lấy nhầm file của nhau.
     """
     output_dir = os.path.join("static", "output_xmind")
     os.makedirs(output_dir, exist_ok=True)
     base_filename = generate_base_filename()
 
-    # Ghi nội dung XMindMark vào file tạm
-    temp_dir = tempfile.mkdtemp()
-    xmindmark_file = os.path.join(temp_dir, f"{base_filename}.xmindmark")
-    with open(xmindmark_file, 'w', encoding='utf-8') as f:
-        f.write(xmindmark_content)
-
-    # Gọi CLI xmindmark
-    subprocess.run(
-        ['xmindmark', xmindmark_file],
-        cwd=output_dir,
-        capture_output=True,
-        text=True,
-        timeout=10
-    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xmindmark_file = os.path.join(temp_dir, f"{base_filename}.xmindmark")
+        with open(xmindmark_file, 'w', encoding='utf-8') as f:
+            f.write(xmindmark_content)
 
-    # Tìm file .xmind mới nhất trong output_dir
-    xmind_files = [
-        os.path.join(output_dir, f)
-        for f in os.listdir(output_dir)
-        if f.endswith('.xmind')
-    ]
+        # Gọi CLI xmindmark
+        subprocess.run(
+            ['xmindmark', xmindmark_file],
+            cwd=temp_dir,
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
 
-    if not xmind_files:
-        return None
+        xmind_files = [f for f in os.listdir(temp_dir) if f.endswith('.xmind')]
+        if not xmind_files:
+            return None
 
-    latest_file = max(xmind_files, key=os.path.getmtime)
-    return latest_file  # Trả về path thực tế thay vì URL
\ No newline at end of file
+        output_path = os.path.join(output_dir, f"{base_filename}.xmind")
+        shutil.copy(os.path.join(temp_dir, xmind_files[0]), output_path)
+        return output_path  # Trả về path thực tế thay vì URL
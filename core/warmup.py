@@ -0,0 +1,45 @@
+import logging
+import time
+
+from agent.graph import warmup_graphs
+from core.llm_handle import used_llm
+from core import prompt as prompt_module
+
+logger = logging.getLogger(__name__)
+
+
+def _warmup_llm_clients():
+    # Khởi tạo sẵn HTTP client của OpenAI SDK và bộ đếm token (tiktoken tải encoding lần đầu)
+    _ = used_llm.root_client, used_llm.root_async_client
+    try:
+        used_llm.get_num_tokens("warmup")
+    except Exception as e:
+        logger.warning(f"Không warmup được tokenizer: {e}")
+
+
+def _warmup_prompts():
+    # Render thử mọi template để lỗi cú pháp/format lộ ra ngay khi khởi động
+    for name in dir(prompt_module):
+        if name.startswith("create_") and name.endswith("_prompt"):
+            create_prompt = getattr(prompt_module, name)
+            argcount = create_prompt.__code__.co_argcount
+            create_prompt(*([""] * argcount))
+
+
+def warmup() -> dict:
+    """
+    Chuẩn bị graph, LLM client và prompt template trước khi worker nhận request.
+    Trả về thời gian (giây) của từng bước.
+    """
+    timings = {}
+    for step, func in (
+        ("graphs", warmup_graphs),
+        ("llm_clients", _warmup_llm_clients),
+        ("prompts", _warmup_prompts),
+    ):
+        start = time.perf_counter()
+        func()
+        timings[step] = time.perf_counter() - start
+
+    logger.info(f"Warmup xong: {timings}")
+    return timings
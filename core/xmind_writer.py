@@ -0,0 +1,62 @@
+import hashlib
+import json
+import uuid
+import zipfile
+from io import BytesIO
+from typing import Dict
+
+from core.xmindmark import parse_xmindmark
+
+STRUCTURE_CLASS = "org.xmind.ui.map.unbalanced"
+CREATOR = {"name": "xmind_gen", "version": "1.0"}
+# Cố định thời gian trong zip để cùng một map luôn cho ra cùng bytes
+_ZIP_DATE_TIME = (2020, 1, 1, 0, 0, 0)
+
+
+def _topic_id(digest: str, index: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"xmind_gen:{digest}:{index}"))
+
+
+def build_content(xmindmark_content: str) -> list:
+    """Dựng content.json (định dạng XMind Zen) từ XMindMark; id sinh ổn định theo nội dung"""
+    root = parse_xmindmark(xmindmark_content)
+    digest = hashlib.sha256(xmindmark_content.encode("utf-8")).hexdigest()
+
+    counter = 0
+    root_topic: Dict = {"id": _topic_id(digest, counter), "class": "topic", "title": root.label, "structureClass": STRUCTURE_CLASS}
+    # Duyệt bằng stack để không giới hạn độ sâu của map
+    stack = [(root, root_topic)]
+    while stack:
+        node, topic = stack.pop()
+        if not node.children:
+            continue
+        attached = []
+        for child in node.children:
+            counter += 1
+            child_topic = {"id": _topic_id(digest, counter), "class": "topic", "title": child.label}
+            attached.append(child_topic)
+            stack.append((child, child_topic))
+        topic["children"] = {"attached": attached}
+
+    return [{
+        "id": _topic_id(digest, -1),
+        "class": "sheet",
+        "title": root.label,
+        "rootTopic": root_topic,
+    }]
+
+
+def build_xmind(xmindmark_content: str) -> bytes:
+    """Tạo file .xmind (zip gồm content.json, metadata.json, manifest.json) hoàn toàn trong bộ nhớ"""
+    files = {
+        "content.json": build_content(xmindmark_content),
+        "metadata.json": {"creator": CREATOR},
+        "manifest.json": {"file-entries": {"content.json": {}, "metadata.json": {}}},
+    }
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            info = zipfile.ZipInfo(name, date_time=_ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, json.dumps(data, ensure_ascii=False))
+    return buffer.getvalue()
@@ -0,0 +1,106 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+_BULLET = re.compile(r"^[-*+]\s+")
+_FENCE = re.compile(r"^```")
+
+
+@dataclass
+class XMindNode:
+    label: str
+    children: List["XMindNode"] = field(default_factory=list)
+
+    def iter_nodes(self) -> Iterator["XMindNode"]:
+        yield self
+        for child in self.children:
+            yield from child.iter_nodes()
+
+    def count(self) -> int:
+        return sum(1 for _ in self.iter_nodes())
+
+    def depth(self) -> int:
+        return 1 + max((child.depth() for child in self.children), default=0)
+
+
+def _indent_width(line: str) -> int:
+    width = 0
+    for char in line:
+        if char == " ":
+            width += 1
+        elif char == "\t":
+            width += 4
+        else:
+            break
+    return width
+
+
+def parse_xmindmark(text: str, default_title: str = "Mind Map") -> XMindNode:
+    """
+    Parse XMindMark thành cây. Chấp nhận thụt lề bằng space hoặc tab với độ rộng bất kỳ;
+    độ sâu được suy ra từ so sánh thụt lề với các dòng cha (stack).
+    """
+    root: Optional[XMindNode] = None
+    # (độ thụt lề, node) của nhánh đang mở
+    stack: List[Tuple[int, XMindNode]] = []
+
+    for raw_line in text.splitlines():
+        if not raw_line.strip() or _FENCE.match(raw_line.strip()):
+            continue
+        indent = _indent_width(raw_line)
+        content = raw_line.strip()
+        is_bullet = bool(_BULLET.match(content))
+        label = _BULLET.sub("", content).strip()
+        if not label:
+            continue
+
+        if root is None:
+            root = XMindNode(label if not is_bullet else default_title)
+            if not is_bullet:
+                continue
+
+        node = XMindNode(label)
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        parent = stack[-1][1] if stack else root
+        parent.children.append(node)
+        stack.append((indent, node))
+
+    return root or XMindNode(default_title)
+
+
+def to_xmindmark(root: XMindNode, indent: str = "  ") -> str:
+    lines = [root.label]
+
+    def walk(node: XMindNode, level: int):
+        for child in node.children:
+            lines.append(f"{indent * level}- {child.label}")
+            walk(child, level + 1)
+
+    walk(root, 0)
+    return "\n".join(lines)
+
+
+def prune(root: XMindNode, max_depth: int, max_nodes: int) -> XMindNode:
+    """
+    Cắt cây theo độ sâu và số node tối đa. Duyệt theo chiều rộng nên các tầng trên
+    (nhánh chính) luôn được giữ trước chi tiết sâu.
+    """
+    pruned_root = XMindNode(root.label)
+    kept = 1
+    queue = deque([(root, pruned_root, 1)])
+
+    while queue and kept < max_nodes:
+        node, copy, depth = queue.popleft()
+        if depth >= max_depth:
+            continue
+        for child in node.children:
+            if kept >= max_nodes:
+                break
+            child_copy = XMindNode(child.label)
+            copy.children.append(child_copy)
+            kept += 1
+            queue.append((child, child_copy, depth + 1))
+
+    return pruned_root
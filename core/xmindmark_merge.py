@@ -0,0 +1,107 @@
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import List, Optional
+
+from core.relevance import fold_diacritics
+from core.xmindmark import XMindNode, parse_xmindmark
+
+# Hai nhãn được coi là cùng một node khi độ giống nhau >= ngưỡng này
+LABEL_MATCH_THRESHOLD = 0.82
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_NUMBER = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=8192)
+def fold_label(label: str) -> str:
+    """Chuẩn hoá nhãn để so khớp: bỏ dấu tiếng Việt, chữ thường, bỏ dấu câu"""
+    text = _NON_WORD.sub(" ", fold_diacritics(label))
+    return _SPACES.sub(" ", text).strip()
+
+
+def label_similarity(a: str, b: str) -> float:
+    fa, fb = fold_label(a), fold_label(b)
+    if fa == fb:
+        return 1.0
+    # "Vòng 1" và "Vòng 2" giống nhau về ký tự nhưng là hai node khác nhau
+    if not fa or not fb or _NUMBER.findall(fa) != _NUMBER.findall(fb):
+        return 0.0
+    tokens_a, tokens_b = set(fa.split()), set(fb.split())
+    jaccard = len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+    matcher = SequenceMatcher(None, fa, fb)
+    if matcher.real_quick_ratio() < LABEL_MATCH_THRESHOLD and jaccard < LABEL_MATCH_THRESHOLD:
+        return jaccard
+    return max(jaccard, matcher.ratio())
+
+
+@dataclass
+class MergeResult:
+    tree: XMindNode
+    # Tỉ lệ node của các chunk sau (không tính chunk đầu) khớp được với node đã có: 0..1
+    overlap: float
+    matched_nodes: int
+    incoming_nodes: int
+
+
+def _copy(node: XMindNode) -> XMindNode:
+    return XMindNode(node.label, [_copy(child) for child in node.children])
+
+
+def _find_match(candidates: List[XMindNode], label: str) -> Optional[XMindNode]:
+    best, best_score = None, LABEL_MATCH_THRESHOLD
+    for candidate in candidates:
+        score = label_similarity(candidate.label, label)
+        if score >= best_score:
+            best, best_score = candidate, score
+            if score == 1.0:
+                break
+    return best
+
+
+def _merge_into(target: XMindNode, source: XMindNode) -> int:
+    """Gộp children của source vào target, trả về số node khớp (bị gộp) được"""
+    matched = 0
+    for child in source.children:
+        existing = _find_match(target.children, child.label)
+        if existing is None:
+            target.children.append(_copy(child))
+        else:
+            matched += 1 + _merge_into(existing, child)
+    return matched
+
+
+def _collapse_duplicate_children(node: XMindNode):
+    """
+    Gộp node con duy nhất có nhãn trùng với node cha (vd. "Chương 1" -> "Chương 1") vào cha
+    để giảm độ sâu; nhãn không bị đổi và không node nào bị bỏ.
+    """
+    for child in node.children:
+        while len(child.children) == 1 and label_similarity(child.label, child.children[0].label) >= LABEL_MATCH_THRESHOLD:
+            child.children = child.children[0].children
+        _collapse_duplicate_children(child)
+
+
+def merge_xmindmark_trees(chunks: List[str], global_title: str) -> MergeResult:
+    """
+    Merge các XMindMark chunk ngay trong process: mỗi chunk là một nhánh chính, các
+    nhánh/node trùng nhau (so khớp mờ, không phân biệt dấu) được gộp lại, kể cả node con
+    duy nhất trùng nhãn với cha. Không node nào bị bỏ hay đổi nhãn. overlap cho biết các chunk trùng nhau nhiều hay ít.
+    """
+    root = XMindNode(global_title)
+    matched = incoming = 0
+
+    for index, chunk in enumerate(chunks):
+        if not chunk.strip():
+            continue
+        tree = parse_xmindmark(chunk)
+        if index > 0:
+            incoming += tree.count()
+        # Gói chunk thành một nhánh để so khớp cả nhãn gốc của chunk
+        matched += _merge_into(root, XMindNode(global_title, [tree]))
+
+    _collapse_duplicate_children(root)
+    overlap = matched / incoming if incoming else 0.0
+    return MergeResult(tree=root, overlap=overlap, matched_nodes=matched, incoming_nodes=incoming)
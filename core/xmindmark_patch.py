@@ -0,0 +1,144 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from core.xmindmark import XMindNode, parse_xmindmark, to_xmindmark
+from core.xmindmark_merge import fold_label, label_similarity, LABEL_MATCH_THRESHOLD
+
+PATH_SEPARATOR = " > "
+PATCH_OPS = ("add", "remove", "rename", "move", "replace")
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+class PatchError(Exception):
+    pass
+
+
+def _copy(node: XMindNode) -> XMindNode:
+    return XMindNode(node.label, [_copy(child) for child in node.children])
+
+
+def split_path(path) -> List[str]:
+    if isinstance(path, list):
+        return [str(p).strip() for p in path if str(p).strip()]
+    return [p.strip() for p in str(path or "").split(">") if p.strip()]
+
+
+def match_child(parent: XMindNode, label: str) -> Optional[int]:
+    """Tìm con theo nhãn: khớp chính xác, rồi bỏ dấu, cuối cùng so khớp mờ"""
+    for i, child in enumerate(parent.children):
+        if child.label == label:
+            return i
+    folded = fold_label(label)
+    for i, child in enumerate(parent.children):
+        if fold_label(child.label) == folded:
+            return i
+    best, best_score = None, LABEL_MATCH_THRESHOLD
+    for i, child in enumerate(parent.children):
+        score = label_similarity(child.label, label)
+        if score >= best_score:
+            best, best_score = i, score
+    return best
+
+
+def path_segments(root: XMindNode, path) -> List[str]:
+    """Các nhãn của đường dẫn tính từ node gốc (bỏ tiêu đề gốc nếu đường dẫn bắt đầu bằng nó)"""
+    segments = split_path(path)
+    if segments and fold_label(segments[0]) == fold_label(root.label):
+        segments = segments[1:]
+    return segments
+
+
+def resolve_path(root: XMindNode, path) -> Tuple[Optional[XMindNode], Optional[int], XMindNode]:
+    """
+    Trả về (node cha, vị trí trong cha, node) cho đường dẫn nhãn "Nhánh A > Nhánh con B".
+    Đường dẫn rỗng hoặc chỉ gồm tiêu đề gốc là node gốc.
+    """
+    parent, index, node = None, None, root
+    for segment in path_segments(root, path):
+        child_index = match_child(node, segment)
+        if child_index is None:
+            raise PatchError(f"Không tìm thấy node '{segment}' trong đường dẫn '{path}'")
+        parent, index, node = node, child_index, node.children[child_index]
+    return parent, index, node
+
+
+def _subtree_from(op: Dict) -> XMindNode:
+    if op.get("subtree"):
+        return parse_xmindmark(str(op["subtree"]))
+    label = str(op.get("label") or "").strip()
+    if not label:
+        raise PatchError(f"Thao tác {op.get('op')} thiếu 'label' hoặc 'subtree'")
+    children = op.get("children") or []
+    if isinstance(children, str):
+        children = [children]
+    if not isinstance(children, list) or not all(isinstance(c, (str, int, float)) for c in children):
+        raise PatchError(f"Thao tác {op.get('op')}: 'children' phải là danh sách nhãn")
+    return XMindNode(label, [XMindNode(str(c).strip()) for c in children if str(c).strip()])
+
+
+def _insert(parent: XMindNode, node: XMindNode, index):
+    if isinstance(index, int) and 0 <= index <= len(parent.children):
+        parent.children.insert(index, node)
+    else:
+        parent.children.append(node)
+
+
+def apply_operation(root: XMindNode, op: Dict):
+    kind = op.get("op")
+    if kind not in PATCH_OPS:
+        raise PatchError(f"Thao tác không hợp lệ: {kind!r}")
+
+    if kind == "add":
+        _, _, parent = resolve_path(root, op.get("path"))
+        _insert(parent, _subtree_from(op), op.get("index"))
+        return
+
+    parent, index, node = resolve_path(root, op.get("path"))
+    if kind == "rename":
+        label = str(op.get("label") or "").strip()
+        if not label:
+            raise PatchError("Thao tác rename thiếu 'label'")
+        node.label = label
+    elif parent is None:
+        raise PatchError(f"Không thể {kind} node gốc")
+    elif kind == "remove":
+        del parent.children[index]
+    elif kind == "replace":
+        replacement = _subtree_from(op)
+        parent.children[index] = replacement
+    elif kind == "move":
+        _, _, target = resolve_path(root, op.get("to"))
+        if any(n is target for n in node.iter_nodes()):
+            raise PatchError("Không thể di chuyển node vào chính nhánh con của nó")
+        del parent.children[index]
+        _insert(target, node, op.get("index"))
+
+
+def apply_patch(xmindmark: str, operations: List[Dict]) -> str:
+    """Áp dụng lần lượt các thao tác lên bản sao của map; lỗi ở bất kỳ thao tác nào -> PatchError"""
+    root = _copy(parse_xmindmark(xmindmark))
+    for op in operations:
+        if not isinstance(op, dict):
+            raise PatchError(f"Thao tác phải là object JSON: {op!r}")
+        try:
+            apply_operation(root, op)
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            # Trường có kiểu không hợp lệ từ LLM: coi như patch lỗi để quay về sinh lại map
+            raise PatchError(f"Thao tác {op.get('op')!r} không hợp lệ: {e}")
+    return to_xmindmark(root)
+
+
+def parse_patch(text: str) -> List[Dict]:
+    """Đọc danh sách thao tác (mảng JSON) từ output của LLM"""
+    text = _FENCE.sub("", text.strip())
+    try:
+        operations = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise PatchError(f"Patch không phải JSON hợp lệ: {e}")
+    if isinstance(operations, dict):
+        operations = operations.get("operations", [operations])
+    if not isinstance(operations, list):
+        raise PatchError("Patch phải là một mảng thao tác")
+    return operations
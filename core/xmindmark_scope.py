@@ -0,0 +1,85 @@
+from typing import List, Optional, Tuple
+
+from core.relevance import tokenize
+from core.xmindmark import XMindNode, parse_xmindmark, to_xmindmark
+from core.xmindmark_patch import PATH_SEPARATOR, PatchError, match_child, path_segments, resolve_path, split_path
+
+
+# Nhãn gốc tạm để nhận ra output không có dòng tiêu đề (dòng đầu đã là bullet)
+_NO_TITLE = "\x00"
+
+
+def _walk_with_path(node: XMindNode, path: List[str]):
+    for child in node.children:
+        child_path = path + [child.label]
+        yield child, child_path
+        yield from _walk_with_path(child, child_path)
+
+
+def locate_branch(root: XMindNode, edit_request: str) -> Optional[List[str]]:
+    """
+    Đoán nhánh mà yêu cầu chỉnh sửa nhắc tới: node có toàn bộ từ trong nhãn xuất hiện
+    trong yêu cầu (so khớp không dấu); nhiều node thoả thì chọn nhãn dài nhất, rồi sâu nhất.
+    Không node nào thoả thì trả về None (sửa toàn bộ map).
+    """
+    request_tokens = set(tokenize(edit_request, bigrams=True))
+    best, best_key = None, None
+    for node, path in _walk_with_path(root, []):
+        label_tokens = set(tokenize(node.label, bigrams=True))
+        if not label_tokens or not label_tokens <= request_tokens:
+            continue
+        key = (len(label_tokens), len(path))
+        if best_key is None or key > best_key:
+            best, best_key = path, key
+    return best
+
+
+def build_scope(root: XMindNode, path) -> Tuple[str, str]:
+    """
+    Trả về (nhánh cần sửa dạng XMindMark, dàn ý ngắn gồm các node tổ tiên và các
+    nhánh anh em) để đưa vào prompt thay cho toàn bộ map.
+    """
+    outline_lines = [root.label]
+    node = root
+    # Đi theo đúng cách resolve_path tìm node, để nhánh gửi LLM trùng với nhánh được splice_subtree thay
+    for depth, segment in enumerate(path_segments(root, path)):
+        child_index = match_child(node, segment)
+        if child_index is None:
+            raise PatchError(f"Không tìm thấy node '{segment}' trong đường dẫn '{path}'")
+        child = node.children[child_index]
+        siblings = [c.label for c in node.children if c is not child]
+        if siblings:
+            outline_lines.append(f"{'  ' * depth}- (các nhánh khác: {', '.join(siblings)})")
+        outline_lines.append(f"{'  ' * depth}- {child.label}")
+        node = child
+    return to_xmindmark(node), "\n".join(outline_lines)
+
+
+def _parse_branch(text: str, label: str) -> XMindNode:
+    """
+    Parse nhánh LLM trả về. LLM đôi khi viết cả dòng đầu dạng bullet ("- Nhánh"), khi đó
+    parse_xmindmark tạo gốc mặc định: một bullet duy nhất thì đó là nhánh, nhiều bullet
+    thì coi là các con của nhánh (giữ nhãn cũ).
+    """
+    branch = parse_xmindmark(text, default_title=_NO_TITLE)
+    if branch.label != _NO_TITLE:
+        return branch
+    if len(branch.children) == 1:
+        return branch.children[0]
+    branch.label = label
+    return branch
+
+
+def splice_subtree(current_xmindmark: str, path, new_subtree: str) -> str:
+    """Thay nhánh tại path bằng nhánh mới (dòng đầu của new_subtree là nhãn nhánh)"""
+    root = parse_xmindmark(current_xmindmark)
+    parent, index, node = resolve_path(root, path)
+    replacement = _parse_branch(new_subtree, node.label)
+    if parent is None:
+        return to_xmindmark(replacement)
+    parent.children[index] = replacement
+    return to_xmindmark(root)
+
+
+def format_path(path) -> str:
+    return PATH_SEPARATOR.join(split_path(path))
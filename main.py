@@ -1,9 +1,44 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
 from api.router import router
 from fastapi.staticfiles import StaticFiles
+from core.warmup import warmup
+from core.render_cache import run_sweeper
+from core.ingest import MAX_UPLOAD_BYTES, sweep_blobs
+from core.process_pool import shutdown_process_pool
+from core.jobs import JOB_BATCH_MAX_BYTES, job_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile graph, khởi tạo client trước khi worker báo sẵn sàng
+    app.state.warmup_timings = warmup()
+    # Dọn định kỳ render cache, file output cũ trong static/ và blob tài liệu
+    sweeper = asyncio.create_task(run_sweeper(extra_sweeps=(sweep_blobs,)))
+    # Worker chạy các job sinh mindmap hàng loạt
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    sweeper.cancel()
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def reject_oversized_upload(request: Request, call_next):
+    # Từ chối sớm theo Content-Length, trước khi body multipart được đọc và spool.
+    # /api/jobs/docs nhận nhiều file trong một request nên có giới hạn tổng riêng
+    content_length = request.headers.get("content-length")
+    max_bytes = JOB_BATCH_MAX_BYTES if request.url.path == "/api/jobs/docs" else MAX_UPLOAD_BYTES
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 1024 * 1024:
+        return JSONResponse(status_code=413, content={"detail": f"Request vượt quá giới hạn {max_bytes} bytes"})
+    return await call_next(request)
+
 
-app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(router, prefix="/api")
 
@@ -13,4 +48,4 @@ async def redirect_to_docs():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0")
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0")
@@ -0,0 +1,32 @@
+from core.cleanup import clean_document
+from core.text_processing import PAGE_BREAK
+
+LONG_LINE = "Đây là một câu rất dài trong thân trang để dòng đầu và dòng cuối của trang vượt quá giới hạn số từ của header footer"
+
+
+def _page(number: int) -> str:
+    return "\n".join([
+        "Báo cáo thường niên 2024",
+        LONG_LINE,
+        f"Nội dung mở đầu riêng của trang {number} với vài chi tiết cụ thể.",
+        f"Ví dụ {number}",
+        f"Phần giải thích cho ví dụ số {number} của tài liệu, không lặp lại ở trang khác.",
+        f"Bảng {number}. Kết quả",
+        "2024",
+        f"Phần kết luận riêng của trang {number} cũng khác các trang còn lại hoàn toàn.",
+        LONG_LINE + f" trang {number}",
+        f"Trang {number}",
+    ])
+
+
+def test_mid_page_short_lines_are_kept():
+    text = PAGE_BREAK.join(_page(n) for n in range(1, 7))
+    cleaned, stats = clean_document(text)
+    for n in range(1, 7):
+        assert f"Ví dụ {n}" in cleaned
+        assert f"Bảng {n}. Kết quả" in cleaned
+    assert cleaned.count("\n2024\n") == 6
+    assert "Báo cáo thường niên" not in cleaned
+    assert "Trang 3" not in cleaned
+    # Header và footer "Trang N" (số được bỏ khi so khớp) lặp lại ở cả 6 trang
+    assert stats["removed_repeated_lines"] == 12
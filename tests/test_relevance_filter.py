@@ -0,0 +1,30 @@
+import textwrap
+
+from core.relevance_filter import _query_terms, filter_relevant
+
+FILLER = "Các đơn vị cần phối hợp chặt chẽ trong công tác quản lý tài sản, ngân sách và nhân sự theo quy định hiện hành."
+TARGET = ("Quy trình phê duyệt hồ sơ gồm tiếp nhận, thẩm định và ký duyệt, sau đó cơ quan trả kết quả "
+          "cho người dân trong vòng năm ngày làm việc kể từ khi nhận đủ hồ sơ hợp lệ.")
+
+
+def _pdf_like_document() -> str:
+    # Không có dòng trống, mỗi dòng bị ngắt cứng ở 80 ký tự như văn bản trích xuất từ PDF
+    lines = []
+    for section in range(1, 21):
+        lines.append(f"{section}. MỤC {section}")
+        body = " ".join([FILLER] * 8 + ([TARGET] if section in (4, 11) else []) + [FILLER] * 4)
+        lines += textwrap.wrap(body, 80)
+    return "\n".join(lines)
+
+
+def test_hard_wrapped_lines_are_kept_as_whole_sentences():
+    filtered, stats = filter_relevant(_pdf_like_document(), "quy trình phê duyệt hồ sơ", keep_ratio=0.3, min_tokens=0)
+    assert stats["relevance_filtered"]
+    assert filtered.replace("\n", " ").count(TARGET) == 2
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_instruction_words_do_not_remove_content_words():
+    assert {"lap", "trinh", "python"} <= set(_query_terms("Hãy tạo sơ đồ tư duy về lập trình Python"))
+    assert "tao" in _query_terms("Tạo mindmap về tảo biển")
+    assert _query_terms("Tạo sơ đồ tư duy tóm tắt tài liệu") == []
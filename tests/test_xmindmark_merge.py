@@ -0,0 +1,16 @@
+from core.xmindmark import parse_xmindmark, to_xmindmark
+from core.xmindmark_merge import merge_xmindmark_trees
+
+DEEP_CHUNK = "A\n- l1\n  - l2\n    - l3\n      - l4\n        - l5\n          - l6\n            - l7"
+
+
+def test_local_merge_keeps_labels_and_depth():
+    result = merge_xmindmark_trees([DEEP_CHUNK, "B\n- b1"], "T")
+    merged = to_xmindmark(result.tree)
+    assert merged == "T\n- " + DEEP_CHUNK.replace("\n", "\n  ") + "\n- B\n  - b1"
+    assert result.tree.count() == parse_xmindmark(DEEP_CHUNK).count() + 3
+
+
+def test_duplicate_single_child_is_collapsed():
+    result = merge_xmindmark_trees(["Chương 1\n- Chương 1\n  - ý a\n  - ý b", "Chương 2\n- ý c"], "T")
+    assert to_xmindmark(result.tree) == "T\n- Chương 1\n  - ý a\n  - ý b\n- Chương 2\n  - ý c"
@@ -0,0 +1,28 @@
+from core.xmindmark import parse_xmindmark
+from core.xmindmark_scope import build_scope, splice_subtree
+
+NESTED_MAP = "Root\n- A\n  - A\n    - deep\n  - other\n- B"
+
+
+def test_repeated_labels_scope_matches_splice():
+    root = parse_xmindmark(NESTED_MAP)
+    subtree, outline = build_scope(root, "A > A")
+    assert subtree == "A\n- deep"
+    assert outline.splitlines()[-1].strip() == "- A"
+    assert "other" in outline
+
+    spliced = splice_subtree(NESTED_MAP, "A > A", "A\n- deeper")
+    assert spliced == "Root\n- A\n  - A\n    - deeper\n  - other\n- B"
+
+
+def test_root_prefixed_path():
+    root = parse_xmindmark(NESTED_MAP)
+    subtree, outline = build_scope(root, "Root > B")
+    assert subtree == "B"
+    assert outline == "Root\n- (các nhánh khác: A)\n- B"
+    assert splice_subtree(NESTED_MAP, "Root > B", "B\n- b1") == "Root\n- A\n  - A\n    - deep\n  - other\n- B\n  - b1"
+
+
+def test_splice_accepts_bulleted_branch():
+    assert splice_subtree(NESTED_MAP, "B", "- B\n  - b1") == "Root\n- A\n  - A\n    - deep\n  - other\n- B\n  - b1"
+    assert splice_subtree(NESTED_MAP, "B", "- b1\n- b2") == "Root\n- A\n  - A\n    - deep\n  - other\n- B\n  - b1\n  - b2"
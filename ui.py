@@ -196,30 +196,33 @@ def render_svg(svg_bytes):
         st.error(f"❌ Lỗi render SVG: {str(e)}")
 
 
+def _post_render(endpoint, content):
+    """Gọi API render, gửi kèm ETag của lần trước để server trả 304 khi map không đổi"""
+    renders = st.session_state.setdefault("render_etags", {})
+    previous = renders.get(endpoint)
+    headers = {}
+    if previous and previous[0] == content:
+        headers["If-None-Match"] = previous[1]
+    response = requests.post(
+        f"{API_BASE_URL}/{endpoint}",
+        json={"content": content},
+        headers=headers
+    )
+    if response.status_code == 304:
+        return previous[2]
+    response.raise_for_status()
+    renders[endpoint] = (content, response.headers.get("ETag"), response.content)
+    return response.content
+
+
 def get_svg_bytes(content):
     """Get SVG bytes from API"""
-    try:
-        response = requests.post(
-            f"{API_BASE_URL}/to-svg",
-            json={"content": content}
-        )
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        raise e
+    return _post_render("to-svg", content)
 
 
 def get_xmind_bytes(content):
     """Get XMind file bytes from API"""
-    try:
-        response = requests.post(
-            f"{API_BASE_URL}/to-xmind",
-            json={"content": content}
-        )
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        raise e
+    return _post_render("to-xmind", content)
 
 
 # --- SIDEBAR ---